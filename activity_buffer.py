@@ -0,0 +1,42 @@
+import logging
+import threading
+from datetime import datetime, timezone
+
+logger = logging.getLogger(__name__)
+
+
+class ActivityBuffer:
+    """Write-behind buffer for users' last_active timestamps.
+
+    Handlers record activity in memory with `touch`; repeated touches by the
+    same user collapse into one entry. `flush` writes everything buffered in
+    a single transaction, so interactive commands no longer wait on a disk
+    write each.
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self.pending = {}  # user_id -> 'YYYY-MM-DD HH:MM:SS' (UTC, like CURRENT_TIMESTAMP)
+        self.lock = threading.Lock()
+
+    def touch(self, user_id):
+        """Record that a user was active just now"""
+        timestamp = datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+        with self.lock:
+            self.pending[user_id] = timestamp
+
+    def flush(self):
+        """Write buffered timestamps; returns how many users were updated"""
+        with self.lock:
+            if not self.pending:
+                return 0
+            pending, self.pending = self.pending, {}
+
+        if not self.db.update_last_active_many(pending):
+            # Keep the entries for the next flush unless newer ones arrived meanwhile
+            with self.lock:
+                for user_id, timestamp in pending.items():
+                    self.pending.setdefault(user_id, timestamp)
+            return 0
+
+        return len(pending)
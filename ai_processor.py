@@ -1,10 +1,29 @@
 from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
 import re
 import logging
+import multiprocessing
 import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from text_utils import strip_html, normalize_whitespace
+from keyword_matcher import KeywordMatcher, load_keyword_tables
+from sentiment_cache import ResultCache
+from metrics import AI_SECONDS, AI_ARTICLES
+from config import DATABASE_PATH, AI_CACHE_SIZE, AI_CACHE_PERSIST, AI_POOL_KIND, AI_POOL_WORKERS
 
 logger = logging.getLogger(__name__)
 
+# Fallback insights based on sentiment only
+FALLBACK_INSIGHTS = {
+    'BULLISH': "Strong fundamentals could support continued upward momentum.",
+    'BEARISH': "Market headwinds may create near-term volatility challenges.",
+    'NEUTRAL': "Development bears monitoring for future market implications.",
+    'SLIGHTLY_BULLISH': "Positive signals suggest gradual improvement potential.",
+    'SLIGHTLY_BEARISH': "Cautious sentiment indicates consolidation may continue."
+}
+
 class AIProcessor:
     def __init__(self):
         logger.info("Initializing AI Processor (Lightweight version)")
@@ -15,6 +34,22 @@ class AIProcessor:
             logger.error(f"Error loading sentiment analyzer: {e}")
             self.sentiment_analyzer = None
 
+        # Worker pool for process_batch, created on first use
+        self.pool = None
+        self._pool_guard = threading.Lock()
+
+        # Results memoized by content hash, optionally backed by SQLite
+        self.cache = ResultCache(AI_CACHE_SIZE, DATABASE_PATH if AI_CACHE_PERSIST else None)
+
+        # Keyword-based insights, matched in one pass per article
+        insight_table = load_keyword_tables()['insight_keywords']
+        self.keyword_insights = {keyword.lower(): insights for keyword, insights in insight_table.items()}
+        self.insight_matcher = KeywordMatcher(self.keyword_insights)
+        self.insight_keywords_by_label = {}
+        for keyword, insights in self.keyword_insights.items():
+            for label in insights:
+                self.insight_keywords_by_label.setdefault(label, set()).add(keyword)
+
     def clean_text(self, text):
         """Clean and preprocess text"""
         if not text:
@@ -22,9 +57,9 @@ class AIProcessor:
 
         try:
             # Remove HTML tags
-            text = re.sub(r'<[^>]+>', '', text)
+            text = strip_html(text)
             # Remove extra whitespace
-            text = ' '.join(text.split())
+            text = normalize_whitespace(text)
             # Remove special characters that might interfere
             text = re.sub(r'[^\w\s.,!?-]', '', text)
             return text
@@ -86,184 +121,208 @@ class AIProcessor:
             if len(clean_text) < 5:
                 return "⚠️", "NEUTRAL"
 
-            # Get VADER scores
-            scores = self.sentiment_analyzer.polarity_scores(clean_text)
-            compound = scores['compound']
-
-            # Determine sentiment with more nuanced thresholds
-            if compound >= 0.2:
-                return "🚀", "BULLISH"
-            elif compound <= -0.2:
-                return "🐻", "BEARISH"
-            elif compound >= 0.05:
-                return "📈", "SLIGHTLY_BULLISH"
-            elif compound <= -0.05:
-                return "📉", "SLIGHTLY_BEARISH"
-            else:
-                return "⚠️", "NEUTRAL"
+            # Identical text was already scored
+            cache_key = ResultCache.make_key('sentiment', clean_text)
+            cached = self.cache.get(cache_key)
+            if cached:
+                return tuple(cached)
+
+            result = self.classify_sentiment(clean_text)
+            self.cache.put(cache_key, list(result))
+            return result
 
         except Exception as e:
             logger.error(f"Sentiment analysis error: {e}")
             return "⚠️", "NEUTRAL"
 
+    def classify_sentiment(self, clean_text):
+        """Score cleaned text with VADER and map it to emoji + label"""
+        # Get VADER scores
+        scores = self.sentiment_analyzer.polarity_scores(clean_text)
+        compound = scores['compound']
+
+        # Determine sentiment with more nuanced thresholds
+        if compound >= 0.2:
+            return "🚀", "BULLISH"
+        elif compound <= -0.2:
+            return "🐻", "BEARISH"
+        elif compound >= 0.05:
+            return "📈", "SLIGHTLY_BULLISH"
+        elif compound <= -0.05:
+            return "📉", "SLIGHTLY_BEARISH"
+        else:
+            return "⚠️", "NEUTRAL"
+
     def generate_investment_insight(self, title, summary, sentiment_label):
         """Generate investment insights based on keywords and sentiment"""
         try:
             # Combine title and summary for analysis
-            text_for_analysis = f"{title} {summary}".lower()
-
-            # Keyword-based insights
-            keyword_insights = {
-                # Bitcoin specific
-                'bitcoin': {
-                    'BULLISH': "Bitcoin strength often signals broader crypto market confidence.",
-                    'BEARISH': "Bitcoin weakness may indicate market-wide caution ahead.",
-                    'NEUTRAL': "Bitcoin developments warrant monitoring for portfolio positioning.",
-                    'SLIGHTLY_BULLISH': "Positive Bitcoin sentiment could support market momentum.",
-                    'SLIGHTLY_BEARISH': "Bitcoin headwinds may create short-term volatility."
-                },
-                'btc': {
-                    'BULLISH': "BTC momentum could drive institutional adoption forward.",
-                    'BEARISH': "BTC concerns may pressure alternative cryptocurrency valuations.",
-                    'NEUTRAL': "BTC movements typically influence broader crypto sentiment.",
-                    'SLIGHTLY_BULLISH': "BTC gains often correlate with increased market activity.",
-                    'SLIGHTLY_BEARISH': "BTC weakness might signal consolidation phase ahead."
-                },
-
-                # Ethereum specific
-                'ethereum': {
-                    'BULLISH': "Ethereum improvements typically boost DeFi ecosystem growth.",
-                    'BEARISH': "Ethereum challenges could impact decentralized applications.",
-                    'NEUTRAL': "Ethereum developments affect the broader smart contract landscape.",
-                    'SLIGHTLY_BULLISH': "Ethereum progress supports long-term blockchain adoption.",
-                    'SLIGHTLY_BEARISH': "Ethereum concerns may slow DeFi innovation pace."
-                },
-                'eth': {
-                    'BULLISH': "ETH strength indicates healthy demand for DeFi services.",
-                    'BEARISH': "ETH pressure might reduce staking and DeFi participation.",
-                    'NEUTRAL': "ETH movements reflect broader smart contract platform health.",
-                    'SLIGHTLY_BULLISH': "ETH developments could enhance network utility value.",
-                    'SLIGHTLY_BEARISH': "ETH headwinds may create DeFi liquidity concerns."
-                },
-
-                # Regulatory
-                'regulation': {
-                    'BULLISH': "Clear regulations could accelerate institutional crypto adoption.",
-                    'BEARISH': "Regulatory uncertainty may constrain market growth potential.",
-                    'NEUTRAL': "Regulatory developments shape long-term market structure.",
-                    'SLIGHTLY_BULLISH': "Regulatory progress supports mainstream acceptance trends.",
-                    'SLIGHTLY_BEARISH': "Regulatory concerns could limit short-term price momentum."
-                },
-                'sec': {
-                    'BULLISH': "Favorable SEC stance may unlock institutional investment flows.",
-                    'BEARISH': "SEC scrutiny could create compliance costs and delays.",
-                    'NEUTRAL': "SEC decisions significantly influence US crypto market access.",
-                    'SLIGHTLY_BULLISH': "SEC clarity benefits long-term market development.",
-                    'SLIGHTLY_BEARISH': "SEC enforcement may increase market volatility short-term."
-                },
-
-                # ETF
-                'etf': {
-                    'BULLISH': "ETF approvals typically increase retail and institutional access.",
-                    'BEARISH': "ETF rejections may delay mainstream adoption timelines.",
-                    'NEUTRAL': "ETF developments affect traditional finance crypto integration.",
-                    'SLIGHTLY_BULLISH': "ETF progress supports price discovery and liquidity.",
-                    'SLIGHTLY_BEARISH': "ETF delays might reduce near-term institutional interest."
-                },
-
-                # Adoption
-                'adoption': {
-                    'BULLISH': "Growing adoption validates cryptocurrency utility and value.",
-                    'BEARISH': "Adoption challenges highlight scalability and usability issues.",
-                    'NEUTRAL': "Adoption metrics indicate long-term market maturation.",
-                    'SLIGHTLY_BULLISH': "Adoption progress supports fundamental value growth.",
-                    'SLIGHTLY_BEARISH': "Adoption slowdown may indicate market saturation risks."
-                },
-
-                # DeFi
-                'defi': {
-                    'BULLISH': "DeFi innovations expand cryptocurrency practical applications.",
-                    'BEARISH': "DeFi risks could undermine trust in decentralized finance.",
-                    'NEUTRAL': "DeFi developments influence blockchain utility perceptions.",
-                    'SLIGHTLY_BULLISH': "DeFi growth demonstrates blockchain technology value.",
-                    'SLIGHTLY_BEARISH': "DeFi concerns may reduce yield farming activity."
-                },
-
-                # Market terms
-                'price': {
-                    'BULLISH': "Price momentum could attract momentum-based investment strategies.",
-                    'BEARISH': "Price pressure may trigger stop-loss selling cascades.",
-                    'NEUTRAL': "Price movements reflect underlying supply-demand dynamics.",
-                    'SLIGHTLY_BULLISH': "Price stability supports long-term value accumulation.",
-                    'SLIGHTLY_BEARISH': "Price volatility may discourage risk-averse investors."
-                },
-                'market': {
-                    'BULLISH': "Strong markets typically correlate with increased crypto interest.",
-                    'BEARISH': "Market weakness often leads to risk-asset liquidation.",
-                    'NEUTRAL': "Market conditions significantly influence crypto performance.",
-                    'SLIGHTLY_BULLISH': "Market strength supports risk-on asset allocation.",
-                    'SLIGHTLY_BEARISH': "Market uncertainty encourages defensive positioning."
-                }
-            }
-
-            # Find matching keywords
-            for keyword, insights in keyword_insights.items():
-                if keyword in text_for_analysis:
-                    if sentiment_label in insights:
-                        return insights[sentiment_label]
-
-            # Fallback insights based on sentiment only
-            fallback_insights = {
-                'BULLISH': "Strong fundamentals could support continued upward momentum.",
-                'BEARISH': "Market headwinds may create near-term volatility challenges.",
-                'NEUTRAL': "Development bears monitoring for future market implications.",
-                'SLIGHTLY_BULLISH': "Positive signals suggest gradual improvement potential.",
-                'SLIGHTLY_BEARISH': "Cautious sentiment indicates consolidation may continue."
-            }
-
-            return fallback_insights.get(sentiment_label, "Market development worth tracking for portfolio impact.")
+            text_for_analysis = f"{title} {summary}"
+
+            # First keyword (in table order) that has an insight for this sentiment
+            candidates = self.insight_keywords_by_label.get(sentiment_label, ())
+            keyword = self.insight_matcher.first_match(text_for_analysis, candidates)
+            if keyword:
+                return self.keyword_insights[keyword][sentiment_label]
+
+            return FALLBACK_INSIGHTS.get(sentiment_label, "Market development worth tracking for portfolio impact.")
 
         except Exception as e:
             logger.error(f"Insight generation error: {e}")
             return "Important development for crypto market participants to monitor."
 
+    def analyze_article(self, title, content):
+        """Create summary, sentiment and insight for an article's text"""
+        # Create summary
+        summary = self.create_summary(title, content)
+
+        # Analyze sentiment
+        emoji, sentiment_label = self.analyze_sentiment(f"{title} {summary}")
+
+        # Generate insight
+        insight = self.generate_investment_insight(title, summary, sentiment_label)
+
+        return {
+            'summary': summary,
+            'emoji': emoji,
+            'sentiment_label': sentiment_label,
+            'insight': insight
+        }
+
+    def build_processed_article(self, article, analysis):
+        """Combine article metadata with its analysis"""
+        return {
+            'guid': article.get('guid') or article.get('link', ''),
+            'title': article.get('title', 'No Title'),
+            'summary': analysis['summary'],
+            'emoji': analysis['emoji'],
+            'sentiment_label': analysis['sentiment_label'],
+            'insight': analysis['insight'],
+            'link': article.get('link', ''),
+            'source': article.get('source_name', 'Unknown'),
+            'source_title': article.get('source_title', 'Unknown'),
+            'published': article.get('published', ''),
+            'processed_at': article.get('fetched_at', '')
+        }
+
+    @staticmethod
+    def article_cache_key(article):
+        """Same cleaned title and summary always yield the same analysis"""
+        return ResultCache.make_key('article', article.get('title', ''), article.get('summary', ''))
+
     def process_article(self, article):
         """Process a single article with AI analysis"""
         try:
-            # Create summary
-            summary = self.create_summary(
-                article.get('title', ''),
-                article.get('summary', '')
-            )
-
-            # Analyze sentiment
-            emoji, sentiment_label = self.analyze_sentiment(
-                f"{article.get('title', '')} {summary}"
-            )
-
-            # Generate insight
-            insight = self.generate_investment_insight(
-                article.get('title', ''),
-                summary,
-                sentiment_label
-            )
-
-            # Return processed article
-            processed_article = {
-                'title': article.get('title', 'No Title'),
-                'summary': summary,
-                'emoji': emoji,
-                'sentiment_label': sentiment_label,
-                'insight': insight,
-                'link': article.get('link', ''),
-                'source': article.get('source_name', 'Unknown'),
-                'source_title': article.get('source_title', 'Unknown'),
-                'published': article.get('published', ''),
-                'processed_at': article.get('fetched_at', '')
-            }
-
-            return processed_article
+            cache_key = self.article_cache_key(article)
+            analysis = self.cache.get(cache_key)
+
+            if analysis is None:
+                analysis = self.analyze_article(article.get('title', ''), article.get('summary', ''))
+                self.cache.put(cache_key, analysis)
+
+            return self.build_processed_article(article, analysis)
+
+        except Exception as e:
+            logger.error(f"Article processing error: {e}")
+            return None
+
+    def get_pool(self):
+        """Get the worker pool for batch processing, or None to run inline"""
+        with self._pool_guard:
+            if self.pool is None and AI_POOL_WORKERS > 0:
+                if AI_POOL_KIND == 'process':
+                    # Workers fork from a clean server process, not from this threaded one
+                    self.pool = ProcessPoolExecutor(
+                        max_workers=AI_POOL_WORKERS,
+                        mp_context=multiprocessing.get_context('forkserver'),
+                        initializer=init_worker
+                    )
+                else:
+                    self.pool = ThreadPoolExecutor(max_workers=AI_POOL_WORKERS, thread_name_prefix='ai')
+                logger.info(f"AI {AI_POOL_KIND} pool started with {AI_POOL_WORKERS} workers")
+
+            return self.pool
 
+    def process_batch(self, articles):
+        """Process articles on the worker pool.
+
+        Blocking; call it off the event loop. Returns one result per input
+        article, in input order, with None for articles that failed.
+        """
+        if not articles:
+            return []
+
+        start = time.perf_counter()
+        keys = [self.article_cache_key(article) for article in articles]
+        analyses = [self.cache.get(key) for key in keys]
+        missing = [i for i, analysis in enumerate(analyses) if analysis is None]
+
+        AI_ARTICLES.inc(len(articles) - len(missing), cache='hit')
+        AI_ARTICLES.inc(len(missing), cache='miss')
+
+        if missing:
+            texts = [(articles[i].get('title', ''), articles[i].get('summary', '')) for i in missing]
+            pool = self.get_pool()
+
+            if pool is None:
+                computed = [self.safe_analyze_article(text) for text in texts]
+            elif isinstance(pool, ProcessPoolExecutor):
+                computed = self.map_on_process_pool(pool, texts)
+            else:
+                computed = list(pool.map(self.safe_analyze_article, texts))
+
+            for i, analysis in zip(missing, computed):
+                if analysis is not None:
+                    analyses[i] = analysis
+                    self.cache.put(keys[i], analysis)
+
+        logger.info(f"Batch processed {len(articles)} articles, {len(articles) - len(missing)} from cache")
+        AI_SECONDS.observe(time.perf_counter() - start)
+
+        return [
+            self.build_processed_article(article, analysis) if analysis is not None else None
+            for article, analysis in zip(articles, analyses)
+        ]
+
+    def map_on_process_pool(self, pool, texts):
+        """Analyze texts on the process pool, inline if a worker died"""
+        try:
+            chunksize = max(1, len(texts) // (AI_POOL_WORKERS * 4))
+            return list(pool.map(analyze_in_worker, texts, chunksize=chunksize))
+        except BrokenProcessPool:
+            logger.error(f"AI process pool broke while analyzing {len(texts)} articles, restarting it")
+            with self._pool_guard:
+                if self.pool is pool:
+                    self.pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return [self.safe_analyze_article(text) for text in texts]
+
+    def safe_analyze_article(self, text):
+        """analyze_article for pool workers: log and return None on failure"""
+        try:
+            return self.analyze_article(*text)
         except Exception as e:
             logger.error(f"Article processing error: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def close(self):
+        """Shut down the batch worker pool"""
+        with self._pool_guard:
+            if self.pool is not None:
+                self.pool.shutdown(wait=False, cancel_futures=True)
+                self.pool = None
+
+
+# Per-process AIProcessor used by the process pool workers
+worker_processor = None
+
+
+def init_worker():
+    """Process pool initializer: load VADER once per worker"""
+    global worker_processor
+    worker_processor = AIProcessor()
+
+
+def analyze_in_worker(text):
+    """Process pool task: analyze one (title, summary) pair"""
+    return worker_processor.safe_analyze_article(text)
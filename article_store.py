@@ -0,0 +1,178 @@
+import logging
+from db_connection import get_connection
+
+logger = logging.getLogger(__name__)
+
+# Stay well below SQLite's bound-parameter limit for IN (...) queries
+QUERY_CHUNK_SIZE = 500
+
+
+class ArticleStore:
+    def __init__(self, db_path='users.db'):
+        self.db_path = db_path
+        self.connection = get_connection(db_path)
+        self.init_db()
+
+    def init_db(self):
+        """Initialize articles table"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS articles (
+                        guid TEXT PRIMARY KEY,
+                        title TEXT,
+                        summary TEXT,
+                        link TEXT,
+                        published TEXT,
+                        source_name TEXT,
+                        source_title TEXT,
+                        fetched_at TEXT,
+                        processed_summary TEXT,
+                        emoji TEXT,
+                        sentiment_label TEXT,
+                        insight TEXT,
+                        processed_at TIMESTAMP,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+
+                # Index for retention pruning
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_articles_created_at
+                    ON articles(created_at)
+                ''')
+
+                logger.info("Article store initialized successfully")
+
+        except Exception as e:
+            logger.error(f"Article store initialization error: {e}")
+
+    @staticmethod
+    def article_key(article):
+        """Stable key for an article: feed guid, falling back to its link"""
+        return article.get('guid') or article.get('link', '')
+
+    def ingest(self, articles):
+        """Insert unseen articles and return the ones that still need processing"""
+        if not articles:
+            return []
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO articles
+                    (guid, title, summary, link, published, source_name, source_title, fetched_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', [
+                    (
+                        self.article_key(article),
+                        article.get('title', ''),
+                        article.get('summary', ''),
+                        article.get('link', ''),
+                        article.get('published', ''),
+                        article.get('source_name', ''),
+                        article.get('source_title', ''),
+                        article.get('fetched_at', '')
+                    )
+                    for article in articles
+                ])
+
+                processed_keys = set()
+                keys = [self.article_key(article) for article in articles]
+                for start in range(0, len(keys), QUERY_CHUNK_SIZE):
+                    chunk = keys[start:start + QUERY_CHUNK_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        SELECT guid FROM articles
+                        WHERE guid IN ({placeholders}) AND sentiment_label IS NOT NULL
+                    ''', chunk)
+                    processed_keys.update(row[0] for row in cursor.fetchall())
+
+                pending = [a for a in articles if self.article_key(a) not in processed_keys]
+                logger.info(f"Ingested {len(articles)} articles, {len(pending)} need processing")
+                return pending
+
+        except Exception as e:
+            logger.error(f"Error ingesting articles: {e}")
+            return list(articles)
+
+    def save_processed(self, processed_articles):
+        """Store AI processing results for articles"""
+        if not processed_articles:
+            return
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    UPDATE articles
+                    SET processed_summary = ?, emoji = ?, sentiment_label = ?,
+                        insight = ?, processed_at = CURRENT_TIMESTAMP
+                    WHERE guid = ?
+                ''', [
+                    (
+                        article.get('summary', ''),
+                        article.get('emoji', ''),
+                        article.get('sentiment_label', ''),
+                        article.get('insight', ''),
+                        self.article_key(article)
+                    )
+                    for article in processed_articles
+                ])
+
+        except Exception as e:
+            logger.error(f"Error saving processed articles: {e}")
+
+    def get_processed(self, guids):
+        """Get already processed articles, keyed by guid"""
+        if not guids:
+            return {}
+
+        try:
+            with self.connection.transaction() as cursor:
+                processed = {}
+                guids = list(guids)
+                for start in range(0, len(guids), QUERY_CHUNK_SIZE):
+                    chunk = guids[start:start + QUERY_CHUNK_SIZE]
+                    placeholders = ','.join('?' * len(chunk))
+                    cursor.execute(f'''
+                        SELECT guid, title, processed_summary, emoji, sentiment_label, insight,
+                               link, source_name, source_title, published, fetched_at
+                        FROM articles
+                        WHERE guid IN ({placeholders}) AND sentiment_label IS NOT NULL
+                    ''', chunk)
+
+                    for row in cursor.fetchall():
+                        processed[row[0]] = {
+                            'guid': row[0],
+                            'title': row[1],
+                            'summary': row[2],
+                            'emoji': row[3],
+                            'sentiment_label': row[4],
+                            'insight': row[5],
+                            'link': row[6],
+                            'source': row[7],
+                            'source_title': row[8],
+                            'published': row[9],
+                            'processed_at': row[10]
+                        }
+
+                return processed
+
+        except Exception as e:
+            logger.error(f"Error getting processed articles: {e}")
+            return {}
+
+    def prune(self, retention_days):
+        """Delete articles older than the retention window"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM articles
+                    WHERE created_at < datetime('now', ?)
+                ''', (f'-{int(retention_days)} days',))
+
+                if cursor.rowcount > 0:
+                    logger.info(f"Pruned {cursor.rowcount} old articles")
+
+        except Exception as e:
+            logger.error(f"Error pruning articles: {e}")
@@ -0,0 +1,40 @@
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# All database work runs here, one call at a time, off the event loop
+db_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db')
+
+
+class AsyncDatabase:
+    """Async facade over a blocking SQLite store.
+
+    Every method of the wrapped store (UserDatabase, BroadcastOutbox, ...)
+    becomes a coroutine that runs on the dedicated database thread, so slow
+    disk I/O never stalls Telegram update processing:
+
+        user = await bot_instance.adb.get_user(user_id)
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def __getattr__(self, name):
+        method = getattr(self.store, name)
+        if not callable(method):
+            return method
+
+        @functools.wraps(method)
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(db_executor, functools.partial(method, *args, **kwargs))
+
+        return call
+
+
+def shutdown_db_executor():
+    """Wait for queued database calls and stop the database thread"""
+    db_executor.shutdown(wait=True)
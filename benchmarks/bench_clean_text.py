@@ -0,0 +1,73 @@
+"""Micro-benchmark per-entry text cleaning: BeautifulSoup on every field vs text_utils.
+
+Usage: python benchmarks/bench_clean_text.py [entries]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup
+from text_utils import clean_html_text
+
+TITLES = [
+    "Bitcoin Surges Past $70,000 as ETF Inflows Hit Record",
+    "SEC Delays Decision on Ethereum ETF Applications",
+    "DeFi Protocol Loses $12M in Flash Loan Exploit",
+    "Solana &amp; XRP Lead Altcoin Rally",
+]
+SUMMARIES = [
+    "<p>Bitcoin climbed to a new high on Tuesday as spot ETF inflows accelerated.</p>",
+    "<p>The regulator pushed back its deadline.</p><p>Analysts expect a decision &quot;within weeks&quot;.</p>",
+    "Plain summary without any markup about market conditions and trading volume.",
+    '<div class="feed"><img src="https://example.com/a.png" /><p>Markets <b>rallied</b> '
+    '<a href="https://example.com">today</a>.</p></div>',
+    "<p>Regulators met on Monday.</p><script>trackView();</script>",
+]
+
+
+def legacy_clean_text(text):
+    """The original NewsAggregator.clean_text body"""
+    if not text:
+        return ""
+    clean_text = BeautifulSoup(text, 'html.parser').get_text()
+    clean_text = ' '.join(clean_text.split())
+    if len(clean_text) > 500:
+        clean_text = clean_text[:500] + "..."
+    return clean_text
+
+
+def make_entries(count, seed=7):
+    rng = random.Random(seed)
+    return [(rng.choice(TITLES), rng.choice(SUMMARIES)) for _ in range(count)]
+
+
+def per_entry_cost(clean, entries):
+    start = time.perf_counter()
+    for title, summary in entries:
+        clean(title)
+        clean(summary)
+    return (time.perf_counter() - start) / len(entries)
+
+
+def main(count):
+    entries = make_entries(count)
+
+    mismatches = sum(
+        1 for title, summary in entries
+        if legacy_clean_text(summary) != clean_html_text(summary, max_length=500)
+    )
+
+    before = per_entry_cost(legacy_clean_text, entries)
+    after = per_entry_cost(lambda text: clean_html_text(text, max_length=500), entries)
+
+    print(f"entries: {count}")
+    print(f"before (BeautifulSoup): {before * 1e6:8.1f} us/entry")
+    print(f"after  (text_utils):    {after * 1e6:8.1f} us/entry")
+    print(f"speedup: {before / after:.1f}x, differing outputs: {mismatches}")
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5000)
@@ -0,0 +1,108 @@
+"""Measure UserDatabase throughput before and after the shared WAL connection.
+
+The legacy implementation opened a new sqlite3 connection (rollback
+journal, synchronous=FULL) for every call; it is reproduced below for the
+three hottest operations and compared with UserDatabase on a fresh
+database file. Subscribers are read with one unbounded query before and
+with keyset pages (as the broadcaster does) after.
+
+Usage: python benchmarks/bench_database.py [users]
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import UserDatabase
+
+
+class LegacyUserDatabase:
+    """Connect-per-call implementation the bot used before"""
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS users (
+                user_id INTEGER PRIMARY KEY,
+                username TEXT,
+                first_name TEXT,
+                last_name TEXT,
+                subscribed BOOLEAN DEFAULT True,
+                digest_time TEXT DEFAULT '09:00',
+                timezone TEXT DEFAULT 'UTC',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_subscribed ON users(subscribed) WHERE subscribed = True')
+        conn.commit()
+        conn.close()
+
+    def add_user(self, user_id, username=None, first_name=None, last_name=None):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('''
+            INSERT OR REPLACE INTO users
+            (user_id, username, first_name, last_name, subscribed, last_active)
+            VALUES (?, ?, ?, ?, True, CURRENT_TIMESTAMP)
+        ''', (user_id, username, first_name, last_name))
+        conn.commit()
+        conn.close()
+
+    def update_last_active(self, user_id):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute('UPDATE users SET last_active = CURRENT_TIMESTAMP WHERE user_id = ?', (user_id,))
+        conn.commit()
+        conn.close()
+
+    def get_subscribed_users(self):
+        conn = sqlite3.connect(self.db_path)
+        rows = conn.execute('SELECT user_id FROM users WHERE subscribed = True').fetchall()
+        conn.close()
+        return [row[0] for row in rows]
+
+
+def timed(ops, func):
+    start = time.perf_counter()
+    for i in range(ops):
+        func(i)
+    return ops / (time.perf_counter() - start)
+
+
+def page_subscribers(db, page_size=1000):
+    """Read every subscribed user ID in keyset pages"""
+    user_ids = []
+    page = db.get_subscriber_page(0, page_size)
+    while page:
+        user_ids.extend(page)
+        page = db.get_subscriber_page(page[-1], page_size)
+    return user_ids
+
+
+def run(db, users, read_subscribers):
+    return {
+        'add_user': timed(users, lambda i: db.add_user(i, f"user{i}", "Bench")),
+        'update_last_active': timed(users, lambda i: db.update_last_active(i)),
+        'read_subscribers': timed(50, lambda i: read_subscribers(db)),
+    }
+
+
+def main(users):
+    with tempfile.TemporaryDirectory() as tmp:
+        before = run(LegacyUserDatabase(os.path.join(tmp, 'legacy.db')), users,
+                     LegacyUserDatabase.get_subscribed_users)
+        after = run(UserDatabase(os.path.join(tmp, 'pooled.db')), users, page_subscribers)
+
+    print(f"users: {users}")
+    print(f"{'operation':<22} {'before (ops/s)':>15} {'after (ops/s)':>14} {'speedup':>8}")
+    for name in before:
+        print(f"{name:<22} {before[name]:>15.0f} {after[name]:>14.0f} {after[name] / before[name]:>7.1f}x")
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
@@ -0,0 +1,93 @@
+"""Benchmark TitleDeduplicator against the original pairwise remove_duplicates.
+
+Usage: python benchmarks/bench_dedup.py [sizes...]
+"""
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dedup import TitleDeduplicator
+
+VOCABULARY = [
+    'bitcoin', 'btc', 'ethereum', 'eth', 'crypto', 'blockchain', 'defi', 'nft',
+    'regulation', 'sec', 'etf', 'adoption', 'price', 'market', 'trading', 'bull',
+    'bear', 'rally', 'drops', 'surges', 'record', 'high', 'low', 'exchange',
+    'wallet', 'token', 'stablecoin', 'solana', 'xrp', 'whales', 'miners', 'fund',
+    'inflows', 'outflows', 'approval', 'lawsuit', 'hack', 'upgrade', 'network', 'fees',
+]
+
+
+def legacy_remove_duplicates(articles):
+    """The original O(n^2) implementation, kept as the reference"""
+    unique_articles = []
+    seen_titles = set()
+
+    for article in articles:
+        title = article['title'].lower().strip()
+        title_words = set(title.split())
+
+        is_duplicate = False
+        for seen_title in seen_titles:
+            seen_words = set(seen_title.split())
+
+            if len(title_words) > 0 and len(seen_words) > 0:
+                common_words = title_words.intersection(seen_words)
+                similarity = len(common_words) / max(len(title_words), len(seen_words))
+
+                if similarity > 0.7:
+                    is_duplicate = True
+                    break
+
+        if not is_duplicate:
+            seen_titles.add(title)
+            unique_articles.append(article)
+
+    return unique_articles
+
+
+def make_articles(count, seed=42):
+    """Synthetic titles with roughly one in four being a reworded repeat"""
+    rng = random.Random(seed)
+    # Headline-like word mix: a few hot crypto terms plus a long tail of rarer words
+    words_pool = VOCABULARY + [f"term{i}" for i in range(5000)]
+    weights = [1 / (rank + 1) for rank in range(len(words_pool))]
+    titles = []
+
+    for i in range(count):
+        if titles and rng.random() < 0.25:
+            words = rng.choice(titles).split()
+            words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+        else:
+            words = rng.choices(words_pool, weights, k=rng.randint(6, 12))
+        titles.append(' '.join(words))
+
+    return [{'title': title} for title in titles]
+
+
+def timed(func, articles):
+    start = time.perf_counter()
+    result = func(articles)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    print(f"{'articles':>9} {'legacy (s)':>11} {'indexed (s)':>12} {'speedup':>8} {'kept':>6}")
+
+    for size in sizes:
+        articles = make_articles(size)
+
+        legacy, legacy_time = timed(legacy_remove_duplicates, articles)
+        indexed, indexed_time = timed(lambda a: TitleDeduplicator(0.7).filter(a), articles)
+
+        if [a['title'] for a in legacy] != [a['title'] for a in indexed]:
+            raise SystemExit(f"Result mismatch at {size} articles")
+
+        print(f"{size:>9} {legacy_time:>11.4f} {indexed_time:>12.4f} "
+              f"{legacy_time / indexed_time:>7.1f}x {len(indexed):>6}")
+
+
+if __name__ == '__main__':
+    main([int(arg) for arg in sys.argv[1:]] or [75, 500, 2000, 5000])
@@ -0,0 +1,98 @@
+"""Measure event-loop responsiveness while a large AI batch is processed.
+
+A ticker coroutine sleeps 10ms in a loop and records how late it wakes up
+while articles are processed (a) inline on the loop, as the bot used to,
+and (b) with AIProcessor.process_batch off the loop on thread and process
+pools.
+
+Usage: python benchmarks/bench_event_loop.py [articles]
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import ai_processor
+from ai_processor import AIProcessor
+
+TICK = 0.01
+
+
+def make_articles(count):
+    # Unique text per article so the result cache never hits
+    return [
+        {
+            'title': f"Bitcoin price rallies as ETF inflows hit record {i}",
+            'summary': (
+                f"Story {i}: Bitcoin climbed sharply on Tuesday as investors cheered strong inflows "
+                "into spot ETFs, while regulators signalled a more constructive stance on the market. "
+                "Analysts warned that volatility could return if macro data disappoints."
+            ),
+            'link': f"https://example.com/{i}",
+            'source_name': 'bench'
+        }
+        for i in range(count)
+    ]
+
+
+async def ticker(lags, stop):
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(time.perf_counter() - start - TICK)
+
+
+async def measure(run_batch):
+    lags, stop = [], asyncio.Event()
+    task = asyncio.create_task(ticker(lags, stop))
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    await run_batch()
+    duration = time.perf_counter() - start
+
+    stop.set()
+    await task
+    lags.sort()
+    return duration, lags[-1] * 1000, lags[len(lags) // 2] * 1000, len(lags)
+
+
+def main(count):
+    articles = make_articles(count)
+
+    async def inline():
+        processor = AIProcessor()
+        for article in articles:
+            processor.process_article(article)
+
+    def pooled(kind, workers):
+        async def run():
+            ai_processor.AI_POOL_KIND = kind
+            ai_processor.AI_POOL_WORKERS = workers
+            processor = AIProcessor()
+            processor.get_pool()
+            try:
+                await asyncio.to_thread(processor.process_batch, articles)
+            finally:
+                processor.close()
+        return run
+
+    scenarios = [
+        ('inline on event loop', inline),
+        ('process_batch, 2 threads', pooled('thread', 2)),
+        ('process_batch, 2 processes', pooled('process', 2)),
+    ]
+
+    print(f"articles: {count}")
+    print(f"{'scenario':<28} {'total (s)':>10} {'max lag (ms)':>13} {'p50 lag (ms)':>13} {'ticks':>6}")
+    for name, run in scenarios:
+        duration, max_lag, median_lag, ticks = asyncio.run(measure(run))
+        print(f"{name:<28} {duration:>10.2f} {max_lag:>13.1f} {median_lag:>13.2f} {ticks:>6}")
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.INFO)
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 2000)
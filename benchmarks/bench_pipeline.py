@@ -0,0 +1,278 @@
+"""Offline benchmark of the digest pipeline on synthetic RSS feeds.
+
+Synthetic feeds (with HTML summaries and ~10% near-duplicate titles) are
+served by a local HTTP server, so runs need no network and are
+repeatable. For each feed size the suite times every stage and records
+its peak traced memory:
+
+    fetch      NewsAggregator.iter_articles (HTTP + parser pool + merge)
+    dedup      NewsAggregator.remove_duplicates
+    rank       NewsAggregator.rank_articles
+    stream     NewsAggregator.stream_latest_news (fetch -> top 50, end to end)
+    ai         AIProcessor.process_article (first --ai-limit unique articles)
+    format     DigestFormatter.format_daily_digest (top 10, --format-repeat times)
+
+Timings come from a run without tracemalloc; memory from a second, traced
+run. Results are written as JSON, and --baseline prints the change against
+an earlier results file.
+
+Usage:
+    python benchmarks/bench_pipeline.py [--entries 50 500 5000 50000]
+        [--parse-workers N] [--output results.json] [--baseline old.json]
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from xml.sax.saxutils import escape
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from news_aggregator import NewsAggregator
+from ai_processor import AIProcessor
+from digest_formatter import DigestFormatter
+from config import FEED_PARSE_WORKERS
+
+SOURCES = ['coindesk', 'cointelegraph', 'decrypt', 'coinmarketcap', 'cryptonews']
+DEFAULT_OUTPUT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results', 'pipeline.json')
+
+SUBJECTS = ['Bitcoin', 'Ethereum', 'Solana', 'XRP', 'Cardano', 'Dogecoin', 'BlackRock', 'Coinbase',
+            'Binance', 'The SEC', 'MicroStrategy', 'Tether', 'Polygon', 'Chainlink', 'Arbitrum']
+EVENTS = ['surges past record high', 'drops as traders take profit', 'rallies on ETF inflows',
+          'faces lawsuit over token sale', 'unveils network upgrade', 'sees whales accumulate',
+          'slides after exchange hack', 'wins regulatory approval', 'hits new trading volume',
+          'draws institutional investment', 'stalls near key resistance', 'expands DeFi adoption']
+TAILS = ['analysts say', 'amid market volatility', 'as funding rates climb', 'ahead of Fed decision',
+         'in Asian trading', 'despite regulatory pressure', 'according to on-chain data', 'this week']
+# Filler words so unrelated titles rarely cross the dedup threshold
+WORDS = [f"{head}{tail}" for head in ('chain', 'coin', 'block', 'hash', 'stake', 'yield', 'swap', 'mint',
+                                       'node', 'vault', 'ledger', 'oracle', 'bridge', 'layer', 'shard',
+                                       'pool', 'fork', 'gas', 'peg', 'whale')
+         for tail in ('', 's', 'ed', 'ing', 'er', 'ly', 'wise', 'fold', 'ward', 'craft',
+                      'line', 'mark', 'point', 'scape', 'works', 'base', 'flow', 'gate', 'hub', 'net')]
+SENTENCES = [
+    'Investors cheered the <b>strong</b> inflows into spot funds.',
+    'Regulators signalled a more constructive stance on the market &amp; its participants.',
+    'Analysts warned that volatility could return if macro data disappoints.',
+    'On-chain data shows long-term holders are <i>not</i> selling.',
+    'Trading volume across major exchanges fell to a two-month low.',
+    'The upgrade is expected to cut fees and improve throughput.',
+    'Critics argue the move could <a href="https://example.com">hurt adoption</a>.',
+]
+
+
+def make_feed(source, start, count, rng):
+    """Build one RSS document with `count` items"""
+    items = []
+    titles = []
+    now = datetime.now(timezone.utc)
+
+    for i in range(start, start + count):
+        if titles and rng.random() < 0.1:
+            # Near-duplicate of an earlier story, as syndicated feeds produce
+            title = rng.choice(titles) + ' ' + rng.choice(['- report', 'update', '(video)'])
+        else:
+            filler = ' '.join(rng.sample(WORDS, 4))
+            title = f"{rng.choice(SUBJECTS)} {rng.choice(EVENTS)} {filler} {rng.choice(TAILS)}"
+            titles.append(title)
+
+        summary = '<p>' + ' '.join(rng.sample(SENTENCES, 3)) + f' Story {i}.</p>'
+        items.append(
+            '<item>'
+            f'<title>{escape(title)}</title>'
+            f'<link>https://{source}.example.com/news/{i}</link>'
+            f'<guid>{source}-{i}</guid>'
+            f'<pubDate>{format_datetime(now)}</pubDate>'
+            f'<description>{escape(summary)}</description>'
+            '</item>'
+        )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>'
+        f'<rss version="2.0"><channel><title>{source} (synthetic)</title>'
+        f'<link>https://{source}.example.com</link><description>Benchmark feed</description>'
+        + ''.join(items) +
+        '</channel></rss>'
+    ).encode('utf-8')
+
+
+def make_fixtures(entries, seed=42):
+    """Spread `entries` items over the sources, returns path -> RSS bytes"""
+    rng = random.Random(seed)
+    per_source, extra = divmod(entries, len(SOURCES))
+    fixtures = {}
+    start = 0
+
+    for n, source in enumerate(SOURCES):
+        count = per_source + (1 if n < extra else 0)
+        fixtures[f'/{source}.xml'] = make_feed(source, start, count, rng)
+        start += count
+
+    return fixtures
+
+
+class FeedServer:
+    """Serve fixtures from a local HTTP server on a free port"""
+
+    def __init__(self, fixtures):
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = fixtures.get(self.path)
+                if body is None:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/rss+xml')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self.thread.start()
+        return f'http://127.0.0.1:{self.server.server_port}'
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def measure(func):
+    """Run func untraced for time, then traced for peak memory"""
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, {'seconds': round(seconds, 6), 'peak_kb': round(peak / 1024, 1)}
+
+
+def run_suite(entries, ai_limit, format_repeat, parse_workers):
+    fixtures = make_fixtures(entries)
+
+    with FeedServer(fixtures) as base_url:
+        aggregator = NewsAggregator(
+            sources={source: f'{base_url}/{source}.xml' for source in SOURCES},
+            max_articles_per_source=entries,
+            min_host_interval=0,
+            parse_workers=parse_workers
+        )
+        processor = AIProcessor()
+        formatter = DigestFormatter()
+        stages = {}
+
+        articles, stages['fetch'] = measure(lambda: list(aggregator.iter_articles()))
+        stages['fetch']['items'] = len(articles)
+
+        unique, stages['dedup'] = measure(lambda: aggregator.remove_duplicates(articles))
+        stages['dedup']['items'] = len(unique)
+
+        ranked, stages['rank'] = measure(lambda: aggregator.rank_articles(list(unique)))
+        stages['rank']['items'] = len(ranked)
+
+        top, stages['stream'] = measure(lambda: list(aggregator.stream_latest_news(50)))
+        stages['stream']['items'] = len(top)
+
+        def process():
+            processor.cache.entries.clear()  # Measure analysis, not cache hits
+            return [processor.process_article(article) for article in ranked[:ai_limit]]
+
+        processed, stages['ai'] = measure(process)
+        stages['ai']['items'] = len(processed)
+
+        def format_digest():
+            for _ in range(format_repeat):
+                message = formatter.format_daily_digest(processed[:10])
+            return message
+
+        _, stages['format'] = measure(format_digest)
+        stages['format']['items'] = format_repeat
+
+        processor.close()
+        aggregator.close()
+
+    return {
+        'fixture_bytes': sum(len(body) for body in fixtures.values()),
+        'stages': stages
+    }
+
+
+def compare(results, baseline):
+    """Print time and memory change per stage against a baseline run"""
+    print(f"\nvs baseline {baseline.get('timestamp', '?')}")
+    print(f"{'entries':>8} {'stage':<8} {'time':>9} {'change':>8} {'peak KB':>10} {'change':>8}")
+
+    for entries, run in results['runs'].items():
+        base_run = baseline.get('runs', {}).get(entries)
+        if not base_run:
+            continue
+
+        for stage, current in run['stages'].items():
+            base = base_run['stages'].get(stage)
+            if not base:
+                continue
+
+            time_change = (current['seconds'] / base['seconds'] - 1) * 100 if base['seconds'] else 0.0
+            mem_change = (current['peak_kb'] / base['peak_kb'] - 1) * 100 if base['peak_kb'] else 0.0
+            print(f"{entries:>8} {stage:<8} {current['seconds']:>8.3f}s {time_change:>+7.1f}% "
+                  f"{current['peak_kb']:>10.1f} {mem_change:>+7.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--entries', type=int, nargs='+', default=[50, 500, 5000],
+                        help='total feed entries per run (50 to 50000)')
+    parser.add_argument('--ai-limit', type=int, default=1000, help='articles sent through AI processing')
+    parser.add_argument('--parse-workers', type=int, default=FEED_PARSE_WORKERS,
+                        help='feed parser processes (0 parses inline)')
+    parser.add_argument('--format-repeat', type=int, default=100, help='digest formatting repetitions')
+    parser.add_argument('--output', default=DEFAULT_OUTPUT, help='JSON results file')
+    parser.add_argument('--baseline', help='earlier JSON results file to compare against')
+    args = parser.parse_args()
+
+    results = {
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'runs': {}
+    }
+
+    print(f"{'entries':>8} {'stage':<8} {'time':>9} {'peak KB':>10} {'items':>7}")
+    for entries in args.entries:
+        run = run_suite(entries, args.ai_limit, args.format_repeat, args.parse_workers)
+        results['runs'][str(entries)] = run
+
+        for stage, result in run['stages'].items():
+            print(f"{entries:>8} {stage:<8} {result['seconds']:>8.3f}s {result['peak_kb']:>10.1f} {result['items']:>7}")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(results, json.load(f))
+
+
+if __name__ == '__main__':
+    import logging
+    logging.disable(logging.WARNING)
+    main()
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import time
+from telegram.error import RetryAfter, Forbidden, BadRequest, NetworkError, TimedOut
+from config import (
+    BROADCAST_RATE, BROADCAST_CONCURRENCY, BROADCAST_PER_CHAT_INTERVAL,
+    BROADCAST_MAX_RETRIES, BROADCAST_PROGRESS_INTERVAL
+)
+
+logger = logging.getLogger(__name__)
+
+# BadRequest messages meaning the chat is gone for good
+PERMANENT_BAD_REQUESTS = ('chat not found', 'user is deactivated', 'peer_id_invalid')
+
+# BadRequest messages caused by the message itself; every chat would reject it
+CONTENT_BAD_REQUESTS = (
+    "can't parse entities", 'message is too long', 'message text is empty', 'text must be non-empty'
+)
+
+
+class TokenBucket:
+    """Async token bucket shared by all broadcast workers"""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.paused_until = 0
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a send is allowed"""
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+
+                # Flood control pauses everyone, not just the worker that hit it
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for a while"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0
+
+
+class BroadcastResult:
+    """Outcome of a broadcast"""
+
+    def __init__(self, total=None):
+        self.total = total
+        self.delivered = []
+        self.blocked = {}   # user_id -> error class name, chat is gone
+        self.failed = {}    # user_id -> error class name, network errors after retries
+        self.rejected = {}  # user_id -> error class name, any other error
+        self.content_error = None  # Error every chat would get, stops the broadcast
+        self.retries = 0
+        self.started_at = time.monotonic()
+        self.finished_at = None
+
+    @property
+    def attempted(self):
+        return len(self.delivered) + len(self.blocked) + len(self.failed) + len(self.rejected)
+
+    @property
+    def duration(self):
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rate(self):
+        """Delivered messages per second"""
+        return len(self.delivered) / self.duration if self.duration > 0 else 0.0
+
+    def summary(self):
+        return (f"{len(self.delivered)} delivered, {len(self.blocked)} blocked, {len(self.failed)} failed, "
+                f"{len(self.rejected)} rejected, {self.retries} retries in {self.duration:.1f}s "
+                f"({self.rate:.1f} msg/s)")
+
+
+def retry_after_seconds(error):
+    """RetryAfter.retry_after as seconds (int in PTB 21, timedelta in later releases)"""
+    retry_after = error.retry_after
+    if hasattr(retry_after, 'total_seconds'):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+def is_permanent_failure(error):
+    """Whether the chat can never receive messages again"""
+    if isinstance(error, Forbidden):
+        return True
+    if isinstance(error, BadRequest):
+        return any(message in str(error).lower() for message in PERMANENT_BAD_REQUESTS)
+    return False
+
+
+def is_content_error(error):
+    """Whether Telegram rejected the message itself rather than the chat"""
+    return isinstance(error, BadRequest) and any(
+        message in str(error).lower() for message in CONTENT_BAD_REQUESTS
+    )
+
+
+def is_chat_failure(error):
+    """Whether delivery to the chat failed transiently (network errors, timeouts)"""
+    return isinstance(error, (TimedOut, NetworkError)) and not isinstance(error, BadRequest)
+
+
+class Broadcaster:
+    """Send the same messages to many chats within Telegram's rate limits.
+
+    Workers share one token bucket for the global limit; each chat's messages
+    are sent in order by one worker, spaced for the per-chat limit.
+    """
+
+    def __init__(self, bot, rate=BROADCAST_RATE, concurrency=BROADCAST_CONCURRENCY,
+                 per_chat_interval=BROADCAST_PER_CHAT_INTERVAL, max_retries=BROADCAST_MAX_RETRIES):
+        self.bot = bot
+        self.bucket = TokenBucket(rate)
+        self.concurrency = concurrency
+        self.per_chat_interval = per_chat_interval
+        self.max_retries = max_retries
+
+    async def send_all(self, user_ids, messages, **send_kwargs):
+        """Send messages to every user and return a BroadcastResult"""
+        if isinstance(messages, str):
+            messages = [messages]
+
+        result = BroadcastResult(total=len(user_ids) if hasattr(user_ids, '__len__') else None)
+        users = iter(user_ids)
+
+        async def worker():
+            # A shared iterator hands each user to exactly one worker
+            for user_id in users:
+                if result.content_error is not None:
+                    return
+                await self.send_to_chat(user_id, messages, result, send_kwargs)
+
+        reporter = asyncio.create_task(self.report_progress(result))
+        try:
+            await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        finally:
+            reporter.cancel()
+            result.finished_at = time.monotonic()
+
+        logger.info(f"Broadcast finished: {result.summary()}")
+        return result
+
+    async def send_to_chat(self, chat_id, messages, result, send_kwargs):
+        """Send all messages to one chat, recording the outcome"""
+        for i, text in enumerate(messages):
+            if i > 0:
+                await asyncio.sleep(self.per_chat_interval)
+
+            error = await self.send_with_retry(chat_id, text, result, send_kwargs)
+
+            if error is not None:
+                if is_permanent_failure(error):
+                    result.blocked[chat_id] = type(error).__name__
+                elif is_chat_failure(error):
+                    result.failed[chat_id] = type(error).__name__
+                else:
+                    result.rejected[chat_id] = type(error).__name__
+                    if is_content_error(error) and result.content_error is None:
+                        result.content_error = error
+                        logger.error(f"Telegram rejected the digest content, stopping broadcast: {error}")
+                logger.warning(f"Failed to send digest to user {chat_id}: {error}")
+                return
+
+        result.delivered.append(chat_id)
+
+    async def send_with_retry(self, chat_id, text, result, send_kwargs):
+        """Send one message, return None on success or the final error"""
+        attempt = 0
+
+        while True:
+            await self.bucket.acquire()
+
+            try:
+                await self.bot.send_message(chat_id=chat_id, text=text, **send_kwargs)
+                return None
+
+            except RetryAfter as e:
+                # Flood control: back off globally and retry the same message
+                wait = retry_after_seconds(e)
+                logger.warning(f"Flood control hit, pausing broadcast for {wait:.0f}s")
+                self.bucket.pause(wait)
+                result.retries += 1
+
+            except (TimedOut, NetworkError) as e:
+                if is_permanent_failure(e) or isinstance(e, BadRequest) or attempt >= self.max_retries:
+                    return e
+
+                attempt += 1
+                result.retries += 1
+                await asyncio.sleep(min(30, 2 ** attempt))
+
+            except Exception as e:
+                return e
+
+    async def report_progress(self, result):
+        """Log throughput periodically while a broadcast runs"""
+        while True:
+            await asyncio.sleep(BROADCAST_PROGRESS_INTERVAL)
+            total = result.total if result.total is not None else '?'
+            logger.info(f"Broadcast progress: {result.attempted}/{total} - {result.summary()}")
@@ -6,6 +6,9 @@ load_dotenv()
 # Telegram Bot Configuration
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 
+# Comma-separated Telegram user IDs allowed to use /stats
+ADMIN_USER_IDS = {int(user_id) for user_id in os.getenv('ADMIN_USER_IDS', '').split(',') if user_id.strip()}
+
 # News Sources (RSS feeds)
 NEWS_SOURCES = {
     'coindesk': 'https://www.coindesk.com/arc/outboundfeeds/rss/',
@@ -18,14 +21,163 @@ NEWS_SOURCES = {
 # Bot Configuration
 MAX_ARTICLES_PER_SOURCE = 15
 TOTAL_ARTICLES_LIMIT = 50
+DEDUP_SIMILARITY_THRESHOLD = 0.7  # Share of common title words to treat as duplicate
+
+# Keyword Tables
+# Set KEYWORDS_FILE to a JSON file with "ranking_keywords" and/or
+# "insight_keywords" to override the defaults below.
+KEYWORDS_FILE = os.getenv('KEYWORDS_FILE', '')
+
+# Keywords that increase article importance (whole-word matches)
+RANKING_KEYWORDS = [
+    'bitcoin', 'btc', 'ethereum', 'eth', 'crypto', 'blockchain',
+    'defi', 'nft', 'regulation', 'sec', 'etf', 'adoption',
+    'price', 'market', 'trading', 'investment', 'bull', 'bear'
+]
+PRIORITY_SOURCES = ['coindesk', 'cointelegraph']
+
+# Investment insight per keyword and sentiment, first matching keyword wins
+INSIGHT_KEYWORDS = {
+    # Bitcoin specific
+    'bitcoin': {
+        'BULLISH': "Bitcoin strength often signals broader crypto market confidence.",
+        'BEARISH': "Bitcoin weakness may indicate market-wide caution ahead.",
+        'NEUTRAL': "Bitcoin developments warrant monitoring for portfolio positioning.",
+        'SLIGHTLY_BULLISH': "Positive Bitcoin sentiment could support market momentum.",
+        'SLIGHTLY_BEARISH': "Bitcoin headwinds may create short-term volatility."
+    },
+    'btc': {
+        'BULLISH': "BTC momentum could drive institutional adoption forward.",
+        'BEARISH': "BTC concerns may pressure alternative cryptocurrency valuations.",
+        'NEUTRAL': "BTC movements typically influence broader crypto sentiment.",
+        'SLIGHTLY_BULLISH': "BTC gains often correlate with increased market activity.",
+        'SLIGHTLY_BEARISH': "BTC weakness might signal consolidation phase ahead."
+    },
+
+    # Ethereum specific
+    'ethereum': {
+        'BULLISH': "Ethereum improvements typically boost DeFi ecosystem growth.",
+        'BEARISH': "Ethereum challenges could impact decentralized applications.",
+        'NEUTRAL': "Ethereum developments affect the broader smart contract landscape.",
+        'SLIGHTLY_BULLISH': "Ethereum progress supports long-term blockchain adoption.",
+        'SLIGHTLY_BEARISH': "Ethereum concerns may slow DeFi innovation pace."
+    },
+    'eth': {
+        'BULLISH': "ETH strength indicates healthy demand for DeFi services.",
+        'BEARISH': "ETH pressure might reduce staking and DeFi participation.",
+        'NEUTRAL': "ETH movements reflect broader smart contract platform health.",
+        'SLIGHTLY_BULLISH': "ETH developments could enhance network utility value.",
+        'SLIGHTLY_BEARISH': "ETH headwinds may create DeFi liquidity concerns."
+    },
+
+    # Regulatory
+    'regulation': {
+        'BULLISH': "Clear regulations could accelerate institutional crypto adoption.",
+        'BEARISH': "Regulatory uncertainty may constrain market growth potential.",
+        'NEUTRAL': "Regulatory developments shape long-term market structure.",
+        'SLIGHTLY_BULLISH': "Regulatory progress supports mainstream acceptance trends.",
+        'SLIGHTLY_BEARISH': "Regulatory concerns could limit short-term price momentum."
+    },
+    'sec': {
+        'BULLISH': "Favorable SEC stance may unlock institutional investment flows.",
+        'BEARISH': "SEC scrutiny could create compliance costs and delays.",
+        'NEUTRAL': "SEC decisions significantly influence US crypto market access.",
+        'SLIGHTLY_BULLISH': "SEC clarity benefits long-term market development.",
+        'SLIGHTLY_BEARISH': "SEC enforcement may increase market volatility short-term."
+    },
+
+    # ETF
+    'etf': {
+        'BULLISH': "ETF approvals typically increase retail and institutional access.",
+        'BEARISH': "ETF rejections may delay mainstream adoption timelines.",
+        'NEUTRAL': "ETF developments affect traditional finance crypto integration.",
+        'SLIGHTLY_BULLISH': "ETF progress supports price discovery and liquidity.",
+        'SLIGHTLY_BEARISH': "ETF delays might reduce near-term institutional interest."
+    },
+
+    # Adoption
+    'adoption': {
+        'BULLISH': "Growing adoption validates cryptocurrency utility and value.",
+        'BEARISH': "Adoption challenges highlight scalability and usability issues.",
+        'NEUTRAL': "Adoption metrics indicate long-term market maturation.",
+        'SLIGHTLY_BULLISH': "Adoption progress supports fundamental value growth.",
+        'SLIGHTLY_BEARISH': "Adoption slowdown may indicate market saturation risks."
+    },
+
+    # DeFi
+    'defi': {
+        'BULLISH': "DeFi innovations expand cryptocurrency practical applications.",
+        'BEARISH': "DeFi risks could undermine trust in decentralized finance.",
+        'NEUTRAL': "DeFi developments influence blockchain utility perceptions.",
+        'SLIGHTLY_BULLISH': "DeFi growth demonstrates blockchain technology value.",
+        'SLIGHTLY_BEARISH': "DeFi concerns may reduce yield farming activity."
+    },
+
+    # Market terms
+    'price': {
+        'BULLISH': "Price momentum could attract momentum-based investment strategies.",
+        'BEARISH': "Price pressure may trigger stop-loss selling cascades.",
+        'NEUTRAL': "Price movements reflect underlying supply-demand dynamics.",
+        'SLIGHTLY_BULLISH': "Price stability supports long-term value accumulation.",
+        'SLIGHTLY_BEARISH': "Price volatility may discourage risk-averse investors."
+    },
+    'market': {
+        'BULLISH': "Strong markets typically correlate with increased crypto interest.",
+        'BEARISH': "Market weakness often leads to risk-asset liquidation.",
+        'NEUTRAL': "Market conditions significantly influence crypto performance.",
+        'SLIGHTLY_BULLISH': "Market strength supports risk-on asset allocation.",
+        'SLIGHTLY_BEARISH': "Market uncertainty encourages defensive positioning."
+    }
+}
+
 DIGEST_ARTICLES_COUNT = 10
 
+# Fetching Configuration
+FETCH_MAX_WORKERS = 8  # Sources fetched in parallel
+PER_HOST_MIN_INTERVAL = 0.5  # Seconds between requests to the same host
+FETCH_TIMEOUT = 15  # Seconds per feed request, and the cap for adaptive timeouts
+SOURCE_TIMEOUT_MIN = 3  # Floor for a source's adaptive timeout
+SOURCE_TIMEOUT_FACTOR = 3  # Adaptive timeout = factor x the source's p95 latency
+SOURCE_LATENCY_WINDOW = 50  # Recent fetch latencies kept per source
+CIRCUIT_FAILURE_THRESHOLD = 3  # Consecutive failures that open a source's circuit
+CIRCUIT_COOLDOWN = 15 * 60  # Seconds a source is skipped once its circuit opens
+CIRCUIT_MAX_COOLDOWN = 4 * 60 * 60  # Cooldown cap after repeated failed trials
+# Feed parser processes; 0 parses inline. Only worth it with dedicated cores
+FEED_PARSE_WORKERS = int(os.getenv('FEED_PARSE_WORKERS', 0))
+
 # Scheduler Configuration
-DIGEST_TIME_HOUR = 9  # 9 AM UTC
+DIGEST_TIME_HOUR = 9  # Default delivery time, UTC
 DIGEST_TIME_MINUTE = 0
+DEFAULT_DIGEST_TIME = f"{DIGEST_TIME_HOUR:02d}:{DIGEST_TIME_MINUTE:02d}"  # For users who never set one
+DELIVERY_SLOT_MINUTES = 15  # Per-user delivery times are grouped into UTC slots of this size
+SNAPSHOT_REFRESH_MINUTES = 10  # Background refresh of processed articles
+SNAPSHOT_MAX_AGE_MINUTES = 30  # Older snapshots are rebuilt inline on request
+DIGEST_RESULT_TTL = 30  # Seconds a built digest is shared with later callers
+
+# Broadcast Configuration (Telegram allows ~30 msg/s overall, 1 msg/s per chat)
+BROADCAST_RATE = 28  # Messages per second across all chats
+BROADCAST_CONCURRENCY = 50  # Chats served at once (covers the per-chat gap for multi-part digests)
+BROADCAST_PER_CHAT_INTERVAL = 1.0  # Seconds between messages to the same chat
+BROADCAST_MAX_RETRIES = 3  # Retries for transient network errors
+BROADCAST_PROGRESS_INTERVAL = 30  # Seconds between progress log lines
+OUTBOX_BATCH_SIZE = 200  # Recipients claimed from the outbox per batch
+SUBSCRIBER_PAGE_SIZE = 1000  # Subscribers read and queued per page
+SOFT_FAILURE_LIMIT = 3  # Consecutive failed deliveries before a user is backed off
+DELIVERY_BACKOFF_HOURS = 24  # Backed-off users are skipped by digests for this long
+OUTBOX_RETENTION_DAYS = 7  # Finished broadcasts kept in the outbox
 
 # Database
 DATABASE_PATH = 'users.db'
+ARTICLE_RETENTION_DAYS = 7  # Processed articles kept in the article store
+ACTIVITY_FLUSH_SECONDS = 5  # last_active updates are buffered and written this often
+STATS_ACTIVE_DAYS = (1, 7, 30)  # Activity windows reported by /stats
+AI_CACHE_SIZE = 5000  # In-memory sentiment/article results (LRU)
+AI_CACHE_PERSIST = os.getenv('AI_CACHE_PERSIST', '').lower() in ('1', 'true', 'yes')
+AI_CACHE_RETENTION_DAYS = 30  # Persisted AI results older than this are pruned daily
+
+# AI Processing Pool ('thread' or 'process'; 0 workers processes inline)
+AI_POOL_KIND = os.getenv('AI_POOL_KIND', 'thread')
+AI_POOL_WORKERS = int(os.getenv('AI_POOL_WORKERS', 2))
 
 # Deployment
 PORT = int(os.environ.get("PORT", 8000))
@@ -1,153 +1,456 @@
-import sqlite3
 from datetime import datetime
 import logging
+from config import (
+    DEFAULT_DIGEST_TIME, SOFT_FAILURE_LIMIT, DELIVERY_BACKOFF_HOURS, STATS_ACTIVE_DAYS
+)
+from delivery_time import delivery_slot
+from db_connection import get_connection
 
 logger = logging.getLogger(__name__)
 
 class UserDatabase:
     def __init__(self, db_path='users.db'):
         self.db_path = db_path
+        self.connection = get_connection(db_path)
         self.init_db()
 
     def init_db(self):
         """Initialize database tables"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                CREATE TABLE IF NOT EXISTS users (
-                    user_id INTEGER PRIMARY KEY,
-                    username TEXT,
-                    first_name TEXT,
-                    last_name TEXT,
-                    subscribed BOOLEAN DEFAULT True,
-                    digest_time TEXT DEFAULT '09:00',
-                    timezone TEXT DEFAULT 'UTC',
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            ''')
-
-            # Create index for faster queries
-            cursor.execute('''
-                CREATE INDEX IF NOT EXISTS idx_subscribed 
-                ON users(subscribed) WHERE subscribed = True
-            ''')
-
-            conn.commit()
-            logger.info("Database initialized successfully")
+            with self.connection.transaction() as cursor:
+                cursor.execute(f'''
+                    CREATE TABLE IF NOT EXISTS users (
+                        user_id INTEGER PRIMARY KEY,
+                        username TEXT,
+                        first_name TEXT,
+                        last_name TEXT,
+                        subscribed BOOLEAN DEFAULT True,
+                        digest_time TEXT DEFAULT '{DEFAULT_DIGEST_TIME}',
+                        timezone TEXT DEFAULT 'UTC',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        last_active TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+
+                # UTC delivery slot derived from digest_time + timezone
+                columns = {row[1] for row in cursor.execute('PRAGMA table_info(users)')}
+                if 'delivery_slot' not in columns:
+                    cursor.execute('ALTER TABLE users ADD COLUMN delivery_slot INTEGER')
+
+                # Delivery health, updated in batches after each broadcast batch
+                if 'last_delivery_error' not in columns:
+                    cursor.execute('ALTER TABLE users ADD COLUMN last_delivery_error TEXT')
+                if 'soft_failures' not in columns:
+                    cursor.execute('ALTER TABLE users ADD COLUMN soft_failures INTEGER DEFAULT 0')
+                if 'backoff_until' not in columns:
+                    cursor.execute('ALTER TABLE users ADD COLUMN backoff_until TIMESTAMP')
+
+                # Covering indexes for keyset paging of subscribers (all, or per slot)
+                for index in ('idx_subscribed', 'idx_delivery_slot', 'idx_subscribed_user', 'idx_slot_user'):
+                    cursor.execute(f'DROP INDEX IF EXISTS {index}')
+
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_subscribers
+                    ON users(user_id, backoff_until) WHERE subscribed = True
+                ''')
+
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_slot_subscribers
+                    ON users(delivery_slot, user_id, backoff_until) WHERE subscribed = True
+                ''')
+
+                # Only users ever backed off, so /stats reads them without a scan
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_backoff
+                    ON users(backoff_until) WHERE backoff_until IS NOT NULL
+                ''')
+
+                # Lets slot recomputation find each (timezone, time) group without a scan
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_delivery_prefs
+                    ON users(timezone, digest_time, delivery_slot)
+                ''')
+
+                logger.info("Database initialized successfully")
+
+            self.init_stats()
+            self.recompute_delivery_slots()
 
         except Exception as e:
             logger.error(f"Database initialization error: {e}")
-        finally:
-            conn.close()
+
+    def init_stats(self):
+        """Create trigger-maintained user counters, backfilling them once"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS user_counters (
+                        name TEXT PRIMARY KEY,
+                        value INTEGER NOT NULL
+                    )
+                ''')
+
+                # Users per day of their last activity, so "active in N days" sums N rows
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS user_activity_days (
+                        day TEXT PRIMARY KEY,
+                        users INTEGER NOT NULL
+                    )
+                ''')
+
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS users_counters_insert AFTER INSERT ON users
+                    BEGIN
+                        UPDATE user_counters SET value = value + 1 WHERE name = 'total';
+                        UPDATE user_counters SET value = value + 1 WHERE name = 'subscribed' AND NEW.subscribed;
+                        INSERT INTO user_activity_days (day, users) VALUES (date(NEW.last_active), 1)
+                            ON CONFLICT(day) DO UPDATE SET users = users + 1;
+                    END
+                ''')
+
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS users_counters_delete AFTER DELETE ON users
+                    BEGIN
+                        UPDATE user_counters SET value = value - 1 WHERE name = 'total';
+                        UPDATE user_counters SET value = value - 1 WHERE name = 'subscribed' AND OLD.subscribed;
+                        UPDATE user_activity_days SET users = users - 1 WHERE day = date(OLD.last_active);
+                    END
+                ''')
+
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS users_counters_subscribed AFTER UPDATE OF subscribed ON users
+                    WHEN COALESCE(OLD.subscribed, 0) != COALESCE(NEW.subscribed, 0)
+                    BEGIN
+                        UPDATE user_counters
+                        SET value = value + (CASE WHEN NEW.subscribed THEN 1 ELSE -1 END)
+                        WHERE name = 'subscribed';
+                    END
+                ''')
+
+                cursor.execute('''
+                    CREATE TRIGGER IF NOT EXISTS users_counters_active AFTER UPDATE OF last_active ON users
+                    WHEN date(OLD.last_active) IS NOT date(NEW.last_active)
+                    BEGIN
+                        UPDATE user_activity_days SET users = users - 1 WHERE day = date(OLD.last_active);
+                        INSERT INTO user_activity_days (day, users) VALUES (date(NEW.last_active), 1)
+                            ON CONFLICT(day) DO UPDATE SET users = users + 1;
+                    END
+                ''')
+
+                # First run on an existing database: one full count, then triggers take over
+                cursor.execute('SELECT COUNT(*) FROM user_counters')
+                if cursor.fetchone()[0] == 0:
+                    cursor.execute('''
+                        INSERT INTO user_counters (name, value)
+                        SELECT 'total', COUNT(*) FROM users
+                        UNION ALL
+                        SELECT 'subscribed', COUNT(*) FROM users WHERE subscribed = True
+                    ''')
+                    cursor.execute('DELETE FROM user_activity_days')
+                    cursor.execute('''
+                        INSERT INTO user_activity_days (day, users)
+                        SELECT date(last_active), COUNT(*) FROM users
+                        WHERE last_active IS NOT NULL
+                        GROUP BY date(last_active)
+                    ''')
+                    logger.info("User counters backfilled")
+
+        except Exception as e:
+            logger.error(f"Stats initialization error: {e}")
 
     def add_user(self, user_id, username=None, first_name=None, last_name=None):
         """Add or update user in database"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
-
-            cursor.execute('''
-                INSERT OR REPLACE INTO users 
-                (user_id, username, first_name, last_name, subscribed, last_active)
-                VALUES (?, ?, ?, ?, True, CURRENT_TIMESTAMP)
-            ''', (user_id, username, first_name, last_name))
+            with self.connection.transaction() as cursor:
+                # Upsert so existing delivery preferences survive a repeated /start
+                cursor.execute('''
+                    INSERT INTO users 
+                    (user_id, username, first_name, last_name, subscribed, last_active, delivery_slot)
+                    VALUES (?, ?, ?, ?, True, CURRENT_TIMESTAMP, ?)
+                    ON CONFLICT(user_id) DO UPDATE SET
+                        username = excluded.username,
+                        first_name = excluded.first_name,
+                        last_name = excluded.last_name,
+                        subscribed = True,
+                        last_active = CURRENT_TIMESTAMP
+                ''', (user_id, username, first_name, last_name, delivery_slot(DEFAULT_DIGEST_TIME)))
 
-            conn.commit()
-            logger.info(f"User {user_id} added/updated successfully")
+                logger.info(f"User {user_id} added/updated successfully")
 
         except Exception as e:
             logger.error(f"Error adding user {user_id}: {e}")
-        finally:
-            conn.close()
 
-    def get_subscribed_users(self):
-        """Get all subscribed user IDs"""
+    def get_subscriber_page(self, after_user_id=0, limit=1000, slot=None):
+        """Get the next page of subscribed user IDs after `after_user_id` (keyset paging)
+
+        Users in delivery backoff are skipped.
+        """
+        try:
+            with self.connection.transaction() as cursor:
+                if slot is None:
+                    cursor.execute('''
+                        SELECT user_id FROM users
+                        WHERE subscribed = True AND user_id > ?
+                          AND (backoff_until IS NULL OR backoff_until <= CURRENT_TIMESTAMP)
+                        ORDER BY user_id LIMIT ?
+                    ''', (after_user_id, limit))
+                else:
+                    cursor.execute('''
+                        SELECT user_id FROM users
+                        WHERE subscribed = True AND delivery_slot = ? AND user_id > ?
+                          AND (backoff_until IS NULL OR backoff_until <= CURRENT_TIMESTAMP)
+                        ORDER BY user_id LIMIT ?
+                    ''', (slot, after_user_id, limit))
+
+                return [row[0] for row in cursor.fetchall()]
+
+        except Exception as e:
+            logger.error(f"Error getting subscriber page after {after_user_id}: {e}")
+            raise
+
+    def record_delivery_results(self, delivered, blocked, failed):
+        """Apply one broadcast batch's outcome in a single transaction.
+
+        `blocked` and `failed` map user_id -> Telegram error class name.
+        Blocked users are unsubscribed; failed users count a soft failure and
+        are backed off after SOFT_FAILURE_LIMIT in a row; a delivery clears
+        the count.
+        """
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    UPDATE users
+                    SET subscribed = False, last_delivery_error = ?
+                    WHERE user_id = ?
+                ''', ((error, user_id) for user_id, error in blocked.items()))
 
-            cursor.execute('SELECT user_id FROM users WHERE subscribed = True')
-            users = cursor.fetchall()
+                cursor.executemany('''
+                    UPDATE users
+                    SET soft_failures = soft_failures + 1,
+                        last_delivery_error = ?,
+                        backoff_until = CASE
+                            WHEN soft_failures + 1 >= ? THEN datetime('now', ?)
+                            ELSE backoff_until
+                        END
+                    WHERE user_id = ?
+                ''', (
+                    (error, SOFT_FAILURE_LIMIT, f'+{int(DELIVERY_BACKOFF_HOURS)} hours', user_id)
+                    for user_id, error in failed.items()
+                ))
 
-            user_ids = [user[0] for user in users]
-            logger.info(f"Retrieved {len(user_ids)} subscribed users")
-            return user_ids
+                cursor.executemany('''
+                    UPDATE users
+                    SET soft_failures = 0, backoff_until = NULL
+                    WHERE user_id = ? AND soft_failures > 0
+                ''', ((user_id,) for user_id in delivered))
+
+            if blocked:
+                logger.info(f"Unsubscribed {len(blocked)} blocked/deleted chats")
 
         except Exception as e:
-            logger.error(f"Error getting subscribed users: {e}")
+            logger.error(f"Error recording delivery results: {e}")
+
+    def get_backoff_users(self, limit=5):
+        """Get the first users (by backoff end) skipped by digests after repeated soft failures"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    SELECT user_id, soft_failures, last_delivery_error, backoff_until
+                    FROM users
+                    WHERE backoff_until > CURRENT_TIMESTAMP AND subscribed = True
+                    ORDER BY backoff_until
+                    LIMIT ?
+                ''', (limit,))
+
+                return [
+                    {
+                        'user_id': row[0],
+                        'soft_failures': row[1],
+                        'last_delivery_error': row[2],
+                        'backoff_until': row[3]
+                    }
+                    for row in cursor.fetchall()
+                ]
+
+        except Exception as e:
+            logger.error(f"Error getting backoff users: {e}")
             return []
-        finally:
-            conn.close()
 
-    def update_subscription(self, user_id, subscribed):
-        """Update user subscription status"""
+    def count_backoff_users(self):
+        """Count users currently in delivery backoff, reading only idx_backoff"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    SELECT COUNT(*) FROM users
+                    WHERE backoff_until > CURRENT_TIMESTAMP AND subscribed = True
+                ''')
 
-            cursor.execute('''
-                UPDATE users 
-                SET subscribed = ?, last_active = CURRENT_TIMESTAMP 
-                WHERE user_id = ?
-            ''', (subscribed, user_id))
+                return cursor.fetchone()[0]
 
-            conn.commit()
+        except Exception as e:
+            logger.error(f"Error counting backoff users: {e}")
+            return 0
 
-            if cursor.rowcount > 0:
-                logger.info(f"User {user_id} subscription updated to {subscribed}")
-                return True
-            else:
-                logger.warning(f"User {user_id} not found in database")
-                return False
+    def get_user(self, user_id):
+        """Get a user's subscription and delivery preferences"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    SELECT subscribed, digest_time, timezone, delivery_slot
+                    FROM users WHERE user_id = ?
+                ''', (user_id,))
+                row = cursor.fetchone()
+
+                if not row:
+                    return None
+
+                return {
+                    'user_id': user_id,
+                    'subscribed': bool(row[0]),
+                    'digest_time': row[1],
+                    'timezone': row[2],
+                    'delivery_slot': row[3]
+                }
+
+        except Exception as e:
+            logger.error(f"Error getting user {user_id}: {e}")
+            return None
+
+    def update_delivery_time(self, user_id, digest_time, timezone):
+        """Update a user's local delivery time and timezone"""
+        slot = delivery_slot(digest_time, timezone)
+        if slot is None:
+            return False
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE users
+                    SET digest_time = ?, timezone = ?, delivery_slot = ?, last_active = CURRENT_TIMESTAMP
+                    WHERE user_id = ?
+                ''', (digest_time, timezone, slot, user_id))
+
+                if cursor.rowcount > 0:
+                    logger.info(f"User {user_id} delivery time set to {digest_time} {timezone} (slot {slot})")
+                    return True
+                else:
+                    logger.warning(f"User {user_id} not found in database")
+                    return False
+
+        except Exception as e:
+            logger.error(f"Error updating delivery time for user {user_id}: {e}")
+            return False
+
+    def recompute_delivery_slots(self):
+        """Recompute UTC slots for today's offsets (daylight saving changes)"""
+        try:
+            with self.connection.transaction() as cursor:
+                # One update per distinct (time, timezone) pair, not per user
+                cursor.execute('SELECT DISTINCT timezone, digest_time FROM users')
+                updates = []
+                for timezone, digest_time in cursor.fetchall():
+                    slot = delivery_slot(digest_time or DEFAULT_DIGEST_TIME, timezone or 'UTC')
+                    if slot is None:
+                        slot = delivery_slot(DEFAULT_DIGEST_TIME)
+                    updates.append((slot, timezone, digest_time, slot))
+
+                cursor.executemany('''
+                    UPDATE users SET delivery_slot = ?
+                    WHERE timezone IS ? AND digest_time IS ? AND delivery_slot IS NOT ?
+                ''', updates)
+
+        except Exception as e:
+            logger.error(f"Error recomputing delivery slots: {e}")
+
+    def update_subscription(self, user_id, subscribed):
+        """Update user subscription status"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE users 
+                    SET subscribed = ?, last_active = CURRENT_TIMESTAMP 
+                    WHERE user_id = ?
+                ''', (subscribed, user_id))
+
+                if cursor.rowcount > 0:
+                    logger.info(f"User {user_id} subscription updated to {subscribed}")
+                    return True
+                else:
+                    logger.warning(f"User {user_id} not found in database")
+                    return False
 
         except Exception as e:
             logger.error(f"Error updating subscription for user {user_id}: {e}")
             return False
-        finally:
-            conn.close()
 
     def get_user_stats(self):
-        """Get user statistics"""
+        """Get user statistics from the trigger-maintained counters"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.connection.transaction() as cursor:
+                cursor.execute('SELECT name, value FROM user_counters')
+                counters = dict(cursor.fetchall())
 
-            cursor.execute('SELECT COUNT(*) FROM users')
-            total_users = cursor.fetchone()[0]
+                total_users = counters.get('total', 0)
+                subscribed_users = counters.get('subscribed', 0)
 
-            cursor.execute('SELECT COUNT(*) FROM users WHERE subscribed = True')
-            subscribed_users = cursor.fetchone()[0]
-
-            return {
-                'total_users': total_users,
-                'subscribed_users': subscribed_users,
-                'unsubscribed_users': total_users - subscribed_users
-            }
+                return {
+                    'total_users': total_users,
+                    'subscribed_users': subscribed_users,
+                    'unsubscribed_users': total_users - subscribed_users
+                }
 
         except Exception as e:
             logger.error(f"Error getting user stats: {e}")
             return {'total_users': 0, 'subscribed_users': 0, 'unsubscribed_users': 0}
-        finally:
-            conn.close()
+
+    def get_active_users(self, days):
+        """Users active within the last `days` days (UTC calendar days, today included)"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    SELECT COALESCE(SUM(users), 0) FROM user_activity_days
+                    WHERE day > date('now', ?)
+                ''', (f'-{int(days)} days',))
+
+                return cursor.fetchone()[0]
+
+        except Exception as e:
+            logger.error(f"Error getting active users for {days} days: {e}")
+            return 0
+
+    def get_stats(self, active_days=STATS_ACTIVE_DAYS):
+        """User counters, active users per window and backoff, without scanning users"""
+        stats = self.get_user_stats()
+        stats['active_users'] = {days: self.get_active_users(days) for days in active_days}
+        stats['backoff_count'] = self.count_backoff_users()
+        stats['backoff_users'] = self.get_backoff_users()
+        return stats
 
     def update_last_active(self, user_id):
         """Update user's last active timestamp"""
         try:
-            conn = sqlite3.connect(self.db_path)
-            cursor = conn.cursor()
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE users 
+                    SET last_active = CURRENT_TIMESTAMP 
+                    WHERE user_id = ?
+                ''', (user_id,))
+
+        except Exception as e:
+            logger.error(f"Error updating last active for user {user_id}: {e}")
 
-            cursor.execute('''
-                UPDATE users 
-                SET last_active = CURRENT_TIMESTAMP 
-                WHERE user_id = ?
-            ''', (user_id,))
+    def update_last_active_many(self, activity):
+        """Update last active timestamps for many users in one transaction"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    UPDATE users 
+                    SET last_active = ? 
+                    WHERE user_id = ?
+                ''', ((timestamp, user_id) for user_id, timestamp in activity.items()))
 
-            conn.commit()
+            return True
 
         except Exception as e:
-            logger.error(f"Error updating last active for user {user_id}: {e}")
-        finally:
-            conn.close()
\ No newline at end of file
+            logger.error(f"Error updating last active for {len(activity)} users: {e}")
+            return False
\ No newline at end of file
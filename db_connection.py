@@ -0,0 +1,97 @@
+import os
+import sqlite3
+import threading
+import logging
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Applied once per connection
+PRAGMAS = (
+    'PRAGMA journal_mode = WAL',      # Readers never block the writer
+    'PRAGMA synchronous = NORMAL',    # fsync at checkpoints, safe with WAL
+    'PRAGMA cache_size = -8000',      # 8 MB page cache
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA busy_timeout = 5000',     # Wait for other processes instead of failing
+)
+
+
+class SQLiteConnection:
+    """A persistent connection to one SQLite file, shared by every store using it.
+
+    sqlite3 keeps compiled statements per connection (`cached_statements`),
+    so reusing one connection also reuses prepared statements. Access is
+    serialized with a lock, which makes it safe to use from the fetch, AI and
+    database worker threads.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.lock = threading.RLock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, cached_statements=256)
+
+        for pragma in PRAGMAS:
+            self.conn.execute(pragma)
+
+        logger.info(f"Opened SQLite connection to {db_path} (WAL)")
+
+    @contextmanager
+    def transaction(self, immediate=False):
+        """Yield a cursor inside a transaction, committing on success.
+
+        `immediate` takes the write lock up front, for read-then-write
+        sequences that must not interleave with other processes.
+        """
+        with self.lock:
+            cursor = self.conn.cursor()
+            try:
+                if immediate:
+                    cursor.execute('BEGIN IMMEDIATE')
+                yield cursor
+                self.conn.commit()
+            except BaseException:
+                self.conn.rollback()
+                raise
+            finally:
+                cursor.close()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+connections = {}
+connections_lock = threading.Lock()
+
+
+def get_connection(db_path):
+    """Get the shared connection for a database file"""
+    key = os.path.abspath(db_path)
+
+    with connections_lock:
+        if key not in connections:
+            connections[key] = SQLiteConnection(db_path)
+        return connections[key]
+
+
+def forget_inherited_connections():
+    """Drop connections inherited through fork; SQLite handles must not cross fork().
+
+    The parent's connections stay open for the parent, the child opens its
+    own on first use. The lock is replaced too, it may have been copied
+    while held by another thread.
+    """
+    global connections, connections_lock
+    connections = {}
+    connections_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=forget_inherited_connections)
+
+
+def close_all():
+    """Close every shared connection (on shutdown)"""
+    with connections_lock:
+        for connection in connections.values():
+            connection.close()
+        connections.clear()
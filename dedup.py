@@ -0,0 +1,82 @@
+import logging
+import math
+from config import DEDUP_SIMILARITY_THRESHOLD
+
+logger = logging.getLogger(__name__)
+
+
+class TitleDeduplicator:
+    """Near-duplicate title detection backed by an inverted token index.
+
+    Two titles are duplicates when the words they share make up more than
+    `threshold` of the longer title's words. Instead of comparing every title
+    with every kept title, candidates are looked up through the index: a title
+    with `a` words can only reach the threshold against titles sharing at least
+    floor(threshold * a) of its words, so probing its `a - m + 1` rarest words
+    is enough to find every possible match (pigeonhole prefix filtering).
+    """
+
+    def __init__(self, threshold=DEDUP_SIMILARITY_THRESHOLD):
+        self.threshold = threshold
+        self.kept_words = []  # word set of every kept title, indexed by id
+        self.index = {}       # word -> ids of kept titles containing it
+
+    @staticmethod
+    def tokenize(title):
+        """Normalize a title into its word set"""
+        return set(title.lower().strip().split())
+
+    def find_duplicate(self, words):
+        """Return the id of a kept title similar to these words, or None"""
+        if not words:
+            return None
+
+        # Minimum shared words any match must have, kept conservative for float rounding
+        min_common = max(1, math.floor(self.threshold * len(words)))
+        probe_count = len(words) - min_common + 1
+
+        # Probe the rarest words first, they yield the fewest candidates
+        probe_words = sorted(words, key=lambda word: len(self.index.get(word, ())))[:probe_count]
+
+        checked = set()
+        for word in probe_words:
+            for title_id in self.index.get(word, ()):
+                if title_id in checked:
+                    continue
+                checked.add(title_id)
+
+                seen_words = self.kept_words[title_id]
+
+                # Length filter: shared words can never exceed the shorter title
+                shorter, longer = sorted((len(words), len(seen_words)))
+                if shorter / longer <= self.threshold:
+                    continue
+
+                common_words = words.intersection(seen_words)
+                similarity = len(common_words) / max(len(words), len(seen_words))
+
+                if similarity > self.threshold:
+                    return title_id
+
+        return None
+
+    def add(self, words):
+        """Index the words of a kept title"""
+        title_id = len(self.kept_words)
+        self.kept_words.append(words)
+        for word in words:
+            self.index.setdefault(word, []).append(title_id)
+
+    def is_duplicate(self, title):
+        """Check a title against kept titles, keeping it if it is new"""
+        words = self.tokenize(title)
+
+        if self.find_duplicate(words) is not None:
+            return True
+
+        self.add(words)
+        return False
+
+    def filter(self, articles):
+        """Return the articles whose titles are not near-duplicates of earlier ones"""
+        return [article for article in articles if not self.is_duplicate(article['title'])]
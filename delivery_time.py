@@ -0,0 +1,55 @@
+"""Helpers for per-user digest delivery times.
+
+Users pick a local HH:MM and an IANA timezone. Delivery runs on a UTC grid
+of DELIVERY_SLOT_MINUTES-wide slots; a user's slot is the number of
+minutes after UTC midnight their local time maps to today, so the offset
+(and DST) is applied when the slot is computed and refreshed daily.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from config import DELIVERY_SLOT_MINUTES
+
+
+def parse_digest_time(text):
+    """Parse 'HH:MM' into (hour, minute), rounded down to the slot grid, or None"""
+    try:
+        hour, minute = (int(part) for part in text.strip().split(':'))
+    except (ValueError, AttributeError):
+        return None
+
+    if not (0 <= hour < 24 and 0 <= minute < 60):
+        return None
+
+    return hour, minute - minute % DELIVERY_SLOT_MINUTES
+
+
+def get_timezone(name):
+    """Return a ZoneInfo for a timezone name, or None if unknown"""
+    try:
+        return ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+
+
+def delivery_slot(digest_time, timezone='UTC', when=None):
+    """UTC slot (minutes after midnight) for a local delivery time on a given day"""
+    parsed = parse_digest_time(digest_time)
+    tz = get_timezone(timezone)
+    if parsed is None or tz is None:
+        return None
+
+    day = (when or datetime.now(tz)).astimezone(tz).date()
+    local = datetime(day.year, day.month, day.day, parsed[0], parsed[1], tzinfo=tz)
+    utc = local.astimezone(dt_timezone.utc)
+
+    minutes = utc.hour * 60 + utc.minute
+    return minutes - minutes % DELIVERY_SLOT_MINUTES
+
+
+def slot_start(slot, now=None):
+    """Most recent UTC start of a slot at or before the given (or current) time"""
+    now = (now or datetime.now(dt_timezone.utc)).astimezone(dt_timezone.utc)
+    start = now.replace(hour=slot // 60, minute=slot % 60, second=0, microsecond=0)
+    if start > now:
+        start -= timedelta(days=1)
+    return start
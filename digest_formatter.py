@@ -1,13 +1,26 @@
 from datetime import datetime
 import logging
+import re
+from config import DELIVERY_SLOT_MINUTES, DEFAULT_DIGEST_TIME
 
 logger = logging.getLogger(__name__)
 
+# Characters with meaning in Telegram's (legacy) Markdown
+MARKDOWN_SPECIAL_RE = re.compile(r'([_*`\[])')
+
 class DigestFormatter:
     def __init__(self):
         self.max_message_length = 4000  # Telegram limit is 4096, leave some buffer
         self.max_title_length = 80
         self.max_summary_length = 200
+        self.max_digest_articles = 10
+
+        # (title, summary, insight) lengths, tried in order when a page runs out of room
+        self.section_limits = [
+            (self.max_title_length, self.max_summary_length, 150),
+            (self.max_title_length, 120, 80),
+            (60, 80, 60)
+        ]
 
     def truncate_text(self, text, max_length, add_ellipsis=True):
         """Truncate text to specified length"""
@@ -17,45 +30,66 @@ class DigestFormatter:
         truncated = text[:max_length].rstrip()
         return truncated + "..." if add_ellipsis else truncated
 
+    def escape_markdown(self, text):
+        """Escape Markdown characters in text placed outside an entity"""
+        return MARKDOWN_SPECIAL_RE.sub(r'\\\1', text or '')
+
+    def strip_entity_chars(self, text, marker):
+        """Drop characters that would close the surrounding entity early"""
+        return (text or '').replace(marker, '')
+
     def format_daily_digest(self, processed_articles):
-        """Format articles into daily digest message"""
+        """Format articles into daily digest pages, each within Telegram's limit"""
         if not processed_articles:
-            return self.format_no_news_message()
+            return [self.format_no_news_message()]
 
         try:
             current_date = datetime.now().strftime("%A, %B %d, %Y")
 
-            # Header
-            message = f"📈 **CRYPTO DIGEST**\n*{current_date}*\n\n"
-
-            # Process articles
-            for i, article in enumerate(processed_articles[:10], 1):
-                article_section = self.format_article_section(article, i)
-
-                # Check if adding this article would exceed message limit
-                if len(message + article_section) > self.max_message_length:
-                    # If we haven't added any articles yet, add a truncated version
-                    if i == 1:
-                        truncated_section = self.format_article_section(article, i, truncate=True)
-                        message += truncated_section
-                    break
-
-                message += article_section
-
-            # Footer
+            header = f"📈 **CRYPTO DIGEST**\n*{current_date}*\n\n"
             footer = "\n💡 **Commands:** /hot for trending | /settings for preferences | /help for more"
 
-            if len(message + footer) <= self.max_message_length:
-                message += footer
+            sections = [
+                [self.format_article_section(article, i, level) for level in range(len(self.section_limits))]
+                for i, article in enumerate(processed_articles[:self.max_digest_articles], 1)
+            ]
 
-            return message
+            return self.pack_pages(header, sections, footer)
 
         except Exception as e:
             logger.error(f"Error formatting daily digest: {e}")
-            return self.format_error_message()
+            return [self.format_error_message()]
+
+    def pack_pages(self, header, sections, footer):
+        """Pack sections into as few pages as possible.
+
+        Each section comes as variants from longest to shortest; the longest
+        variant that still fits the current page is used, and a new page is
+        only started when even the shortest does not fit. Sections are never
+        split, so Markdown entities stay intact.
+        """
+        pages = []
+        parts, length = [header], len(header)
+
+        for variants in sections:
+            for variant in variants:
+                if length + len(variant) <= self.max_message_length:
+                    parts.append(variant)
+                    length += len(variant)
+                    break
+            else:
+                pages.append(''.join(parts).rstrip())
+                parts, length = [variants[0]], len(variants[0])
+
+        # Footer only if it fits, never on a page of its own
+        if length + len(footer) <= self.max_message_length:
+            parts.append(footer)
+
+        pages.append(''.join(parts).rstrip())
+        return pages
 
-    def format_article_section(self, article, number, truncate=False):
-        """Format individual article section"""
+    def format_article_section(self, article, number, level=0):
+        """Format individual article section, trimmed more at higher levels"""
         try:
             emoji = article.get('emoji', '⚠️')
             sentiment = article.get('sentiment_label', 'NEUTRAL')
@@ -65,13 +99,12 @@ class DigestFormatter:
             source = article.get('source', 'Unknown')
 
             # Truncate for length
-            max_title = 60 if truncate else self.max_title_length
-            max_summary = 120 if truncate else self.max_summary_length
-            max_insight = 80 if truncate else 150
+            max_title, max_summary, max_insight = self.section_limits[level]
 
-            title = self.truncate_text(title, max_title)
-            summary = self.truncate_text(summary, max_summary)
-            insight = self.truncate_text(insight, max_insight)
+            title = self.escape_markdown(self.truncate_text(title, max_title))
+            summary = self.strip_entity_chars(self.truncate_text(summary, max_summary), '*')
+            insight = self.escape_markdown(self.truncate_text(insight, max_insight))
+            source = self.strip_entity_chars(source, '*')
 
             # Format sentiment label for display
             display_sentiment = sentiment.replace('_', ' ')
@@ -115,8 +148,8 @@ class DigestFormatter:
             if bullish_stories:
                 message += "🚀 **BULLISH TRENDS**\n"
                 for article in bullish_stories[:4]:
-                    title = self.truncate_text(article.get('title', ''), 65)
-                    source = article.get('source', 'Unknown')
+                    title = self.escape_markdown(self.truncate_text(article.get('title', ''), 65))
+                    source = self.strip_entity_chars(article.get('source', 'Unknown'), '*')
                     message += f"• {title} *({source})*\n"
                 message += "\n"
 
@@ -125,8 +158,8 @@ class DigestFormatter:
             if bearish_stories:
                 message += "🐻 **BEARISH TRENDS**\n"
                 for article in bearish_stories[:4]:
-                    title = self.truncate_text(article.get('title', ''), 65)
-                    source = article.get('source', 'Unknown')
+                    title = self.escape_markdown(self.truncate_text(article.get('title', ''), 65))
+                    source = self.strip_entity_chars(article.get('source', 'Unknown'), '*')
                     message += f"• {title} *({source})*\n"
                 message += "\n"
 
@@ -134,8 +167,8 @@ class DigestFormatter:
             if sentiment_groups['NEUTRAL']:
                 message += "⚠️ **NEUTRAL DEVELOPMENTS**\n"
                 for article in sentiment_groups['NEUTRAL'][:3]:
-                    title = self.truncate_text(article.get('title', ''), 65)
-                    source = article.get('source', 'Unknown')
+                    title = self.escape_markdown(self.truncate_text(article.get('title', ''), 65))
+                    source = self.strip_entity_chars(article.get('source', 'Unknown'), '*')
                     message += f"• {title} *({source})*\n"
 
             message += "\n💡 Use /today for detailed analysis!"
@@ -156,7 +189,7 @@ class DigestFormatter:
             "• Daily top 10 crypto news summaries\n"
             "• 🚀🐻 Smart sentiment analysis\n"
             "• 💡 Investment insights for each story\n"
-            "• 🕘 Automated delivery at 9 AM UTC\n"
+            "• 🕘 Automated delivery at the time you choose\n"
             "• 📰 Multiple trusted news sources\n\n"
 
             "**⚡ Quick Commands:**\n"
@@ -182,9 +215,10 @@ class DigestFormatter:
             "/hot - Trending news organized by sentiment\n\n"
 
             "**⚙️ Settings & Subscriptions:**\n"
-            "/subscribe - Enable daily 9 AM UTC digests\n"
+            "/subscribe - Enable daily digests\n"
             "/unsubscribe - Disable daily digests\n"
-            "/settings - View current preferences\n\n"
+            "/settings - View current preferences\n"
+            "/settings time 08:30 Europe/Berlin - Change delivery time\n\n"
 
             "**ℹ️ Information:**\n"
             "/start - Show welcome message\n"
@@ -201,7 +235,8 @@ class DigestFormatter:
             "CoinDesk • CoinTelegraph • Decrypt • CoinMarketCap • CryptoNews\n\n"
 
             "**🔔 Daily Digest:**\n"
-            "Subscribe to receive automated daily summaries at 9 AM UTC with the most important crypto developments!\n\n"
+            "Subscribe to receive automated daily summaries with the most important crypto developments, "
+            "then pick your delivery time with /settings time!\n\n"
 
             "**💡 Tips:**\n"
             "• Use /today for instant updates\n"
@@ -211,7 +246,7 @@ class DigestFormatter:
             "*Questions? Just ask or try any command above!*"
         )
 
-    def format_settings_message(self, user_subscribed=True):
+    def format_settings_message(self, user_subscribed=True, digest_time=DEFAULT_DIGEST_TIME, timezone='UTC'):
         """Settings and preferences message"""
         subscription_status = "✅ Enabled" if user_subscribed else "❌ Disabled"
 
@@ -220,7 +255,7 @@ class DigestFormatter:
 
             "**📅 Daily Digest:**\n"
             f"Status: {subscription_status}\n"
-            "Time: 9:00 AM UTC daily\n"
+            f"Time: {digest_time} ({self.escape_markdown(timezone)}) daily\n"
             "Content: Top 10 crypto stories + insights\n\n"
 
             "**📊 News Sources:**\n"
@@ -239,12 +274,103 @@ class DigestFormatter:
             "**🔧 Available Actions:**\n"
             "/subscribe - Enable daily digests\n"
             "/unsubscribe - Disable daily digests\n"
+            "/settings time 08:30 Europe/Berlin - Change delivery time\n"
             "/today - Get instant digest\n"
             "/hot - View trending sentiment\n\n"
 
             "*More customization options coming soon!*"
         )
 
+    def format_delivery_time_updated(self, digest_time, timezone):
+        """Delivery time change confirmation"""
+        return (
+            "✅ **Delivery Time Updated!**\n\n"
+            f"Your daily digest will arrive at **{digest_time}** ({self.escape_markdown(timezone)}).\n\n"
+            "*Use /settings to review your preferences*"
+        )
+
+    def format_settings_usage(self):
+        """Help for changing the delivery time"""
+        return (
+            "⚙️ **Change Delivery Time**\n\n"
+            "Usage: /settings time HH:MM [Timezone]\n\n"
+            "**Examples:**\n"
+            "• /settings time 08:30\n"
+            "• /settings time 07:00 Europe/Berlin\n"
+            "• /settings time 18:45 America/New\\_York\n\n"
+            f"Times are rounded down to {DELIVERY_SLOT_MINUTES}-minute steps."
+        )
+
+    def format_stats_message(self, stats):
+        """Admin statistics message"""
+        message = (
+            "📊 **BOT STATS**\n\n"
+            "**👥 Users:**\n"
+            f"Total: {stats.get('total_users', 0)}\n"
+            f"Subscribed: {stats.get('subscribed_users', 0)}\n"
+            f"Unsubscribed: {stats.get('unsubscribed_users', 0)}\n"
+            f"In delivery backoff: {stats.get('backoff_count', 0)}\n\n"
+            "**⚡ Active:**\n"
+        )
+
+        for days, count in stats.get('active_users', {}).items():
+            message += f"Last {days} day{'s' if days != 1 else ''}: {count}\n"
+
+        backoff_users = stats.get('backoff_users', [])
+        if backoff_users:
+            message += "\n**⏸ In Backoff:**\n"
+            for user in backoff_users:
+                error = self.escape_markdown(user['last_delivery_error'] or 'unknown')
+                message += (
+                    f"• {user['user_id']}: {user['soft_failures']} failures ({error}), "
+                    f"until {user['backoff_until']} UTC\n"
+                )
+            if stats.get('backoff_count', 0) > len(backoff_users):
+                message += f"…and {stats['backoff_count'] - len(backoff_users)} more\n"
+
+        broadcasts = stats.get('broadcasts', [])
+        if broadcasts:
+            message += "\n**📤 Recent Broadcasts:**\n"
+            for digest in broadcasts:
+                digest_id = digest['digest_id'].replace('_', '\\_')
+                message += (
+                    f"• {digest_id} ({digest['status']}): "
+                    f"{digest['sent']}/{digest['recipients']} sent, {digest['failed']} failed\n"
+                )
+
+        sources = stats.get('sources', [])
+        if sources:
+            message += "\n**🛰 Sources:**\n"
+            for source in sources:
+                message += self.format_source_health(source)
+
+        return message
+
+    def format_source_health(self, source):
+        """One /stats line for a news source's health record"""
+        name = self.escape_markdown(source['source'])
+
+        if source['p50'] is None:
+            latency = "no data"
+        else:
+            latency = f"p50 {source['p50']:.1f}s, p95 {source['p95']:.1f}s"
+
+        last_success = source['last_success'].strftime('%H:%M UTC') if source['last_success'] else "never"
+
+        if source['state'] == 'open':
+            return (
+                f"⛔ {name}: skipped for {source['reopens_in'] // 60 + 1} min, "
+                f"{source['error_streak']} errors in a row, last ok {last_success}\n"
+            )
+
+        if source['state'] == 'half_open':
+            return f"🔄 {name}: retrying after {source['error_streak']} errors, last ok {last_success}\n"
+
+        line = f"✅ {name}: {latency}, last ok {last_success}"
+        if source['error_streak']:
+            line += f", {source['error_streak']} recent errors"
+        return line + "\n"
+
     def format_no_news_message(self):
         """Message when no news is available"""
         return (
@@ -271,11 +397,12 @@ class DigestFormatter:
             "I'm working to fix this quickly! 🔧"
         )
 
-    def format_subscription_success(self):
+    def format_subscription_success(self, digest_time=DEFAULT_DIGEST_TIME, timezone='UTC'):
         """Subscription success message"""
         return (
             "✅ **Successfully Subscribed!**\n\n"
-            "🎉 You'll now receive daily crypto digests at **9:00 AM UTC**.\n\n"
+            f"🎉 You'll now receive daily crypto digests at **{digest_time}** ({self.escape_markdown(timezone)}).\n"
+            "Change it with /settings time HH:MM [Timezone]\n\n"
             "**What you'll get:**\n"
             "• Top 10 most important crypto stories\n"
             "• AI sentiment analysis for each story\n"
@@ -0,0 +1,42 @@
+"""Feed parsing for the parse-worker process pool.
+
+`parse_feed` runs in worker processes: it takes raw feed bytes and returns
+only what the aggregator needs, as compact tuples, so large feeds parse in
+parallel across cores and little data crosses the process boundary.
+"""
+import feedparser
+from text_utils import clean_html_text
+
+# Skip date parsing issues
+feedparser._parse_date = lambda x: None
+
+
+def parse_feed(content, source_name, max_entries):
+    """Parse raw feed bytes.
+
+    Returns (feed_title, warning, entries) where each entry is a
+    (title, summary, link, published, guid) tuple of cleaned strings.
+    Entries without a title or link are dropped.
+    """
+    feed = feedparser.parse(content)
+
+    warning = str(feed.bozo_exception) if feed.bozo and feed.bozo_exception else None
+    feed_title = getattr(feed.feed, 'title', source_name)
+    entries = []
+
+    for i, entry in enumerate(feed.entries[:max_entries]):
+        title = clean_html_text(getattr(entry, 'title', 'No Title'), max_length=500)
+        link = getattr(entry, 'link', '')
+
+        if not title or title == 'No Title' or not link:
+            continue
+
+        entries.append((
+            title,
+            clean_html_text(getattr(entry, 'summary', '') or getattr(entry, 'description', ''), max_length=500),
+            link,
+            getattr(entry, 'published', ''),
+            getattr(entry, 'id', '') or link or f"{source_name}_{i}"
+        ))
+
+    return feed_title, warning, entries
@@ -0,0 +1,69 @@
+import json
+import logging
+import re
+from config import KEYWORDS_FILE, RANKING_KEYWORDS, INSIGHT_KEYWORDS
+
+logger = logging.getLogger(__name__)
+
+
+class KeywordMatcher:
+    """Match a fixed keyword list against text in a single regex pass.
+
+    All keywords are compiled once into one alternation with word
+    boundaries, so 'eth' matches "ETH" but not "Ethereum" or "together".
+    A plural suffix is allowed, so 'etf' also matches "ETFs" and 'price'
+    matches "prices"; matches are reported as the keyword itself.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = [keyword.lower() for keyword in keywords]
+        self.priority = {keyword: i for i, keyword in enumerate(self.keywords)}
+
+        # Longest first so multi-word keywords win over their prefixes
+        alternatives = sorted(set(self.keywords), key=len, reverse=True)
+        if alternatives:
+            pattern = r'\b(' + '|'.join(re.escape(keyword) for keyword in alternatives) + r')(?:s|es)?\b'
+        else:
+            pattern = r'(?!x)x'  # Matches nothing
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+
+    def find_all(self, text):
+        """Return the set of keywords present in the text"""
+        if not text:
+            return set()
+        return {match.lower() for match in self.pattern.findall(text)}
+
+    def first_match(self, text, candidates=None):
+        """Return the highest priority keyword present in the text, or None"""
+        hits = self.find_all(text)
+        if candidates is not None:
+            hits = hits.intersection(candidates)
+        if not hits:
+            return None
+        return min(hits, key=self.priority.get)
+
+
+def load_keyword_tables(path=KEYWORDS_FILE):
+    """Load ranking and insight keyword tables, with overrides from a JSON file"""
+    tables = {
+        'ranking_keywords': list(RANKING_KEYWORDS),
+        'insight_keywords': dict(INSIGHT_KEYWORDS)
+    }
+
+    if not path:
+        return tables
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            overrides = json.load(f)
+
+        for name in tables:
+            if name in overrides:
+                tables[name] = overrides[name]
+
+        logger.info(f"Loaded keyword tables from {path}")
+
+    except Exception as e:
+        logger.error(f"Error loading keyword tables from {path}: {e}")
+
+    return tables
@@ -9,12 +9,23 @@ from telegram.ext import Application, CommandHandler, MessageHandler, filters, C
 from telegram.constants import ParseMode
 from telegram.error import TelegramError, NetworkError, TimedOut
 
-from config import TELEGRAM_BOT_TOKEN, PORT, RENDER_URL
+from config import (
+    TELEGRAM_BOT_TOKEN, PORT, RENDER_URL, DATABASE_PATH, ARTICLE_RETENTION_DAYS, ADMIN_USER_IDS,
+    SNAPSHOT_MAX_AGE_MINUTES, DIGEST_RESULT_TTL
+)
 from database import UserDatabase
+from article_store import ArticleStore
+from activity_buffer import ActivityBuffer
 from news_aggregator import NewsAggregator
 from ai_processor import AIProcessor
 from digest_formatter import DigestFormatter
 from scheduler import DigestScheduler
+from delivery_time import parse_digest_time, get_timezone
+from singleflight import SingleFlight
+from metrics import FORMAT_SECONDS, HANDLER_SECONDS
+from webhook_server import run_webhook
+from db_connection import close_all
+from async_database import AsyncDatabase, shutdown_db_executor
 
 # Configure logging
 logging.basicConfig(
@@ -39,11 +50,24 @@ class CryptoNewsBot:
 
         try:
             self.db = UserDatabase()
+            self.activity = ActivityBuffer(self.db)
+
+            # Handlers and the scheduler reach SQLite through the database thread
+            self.adb = AsyncDatabase(self.db)
+            self.article_store = ArticleStore(DATABASE_PATH)
             self.news_aggregator = NewsAggregator()
             self.ai_processor = AIProcessor()
             self.formatter = DigestFormatter()
             self.scheduler = None
 
+            # Processed articles refreshed in the background by the scheduler
+            self.snapshot = None
+            self.snapshot_built_at = None
+
+            # Concurrent requests share one in-flight build
+            self.snapshot_flight = SingleFlight()
+            self.digest_flights = SingleFlight(ttl=DIGEST_RESULT_TTL)
+
             logger.info("✅ All components initialized successfully")
 
         except Exception as e:
@@ -55,82 +79,147 @@ class CryptoNewsBot:
         if not articles:
             return []
 
-        processed = []
+        # Store access and AI scoring block, run them off the event loop
+        return await asyncio.to_thread(self.process_articles_blocking, articles)
 
-        logger.info(f"Processing {len(articles)} articles with AI...")
+    def process_articles_blocking(self, articles):
+        """Process new articles on the AI pool and merge with stored results"""
+        # Only articles not processed in an earlier run need AI analysis
+        pending = self.article_store.ingest(articles)
+        self.article_store.prune(ARTICLE_RETENTION_DAYS)
 
-        for i, article in enumerate(articles, 1):
-            try:
-                processed_article = self.ai_processor.process_article(article)
+        logger.info(f"Processing {len(pending)} new articles with AI...")
 
-                if processed_article:
-                    processed.append(processed_article)
+        processed = [
+            processed_article for processed_article in self.ai_processor.process_batch(pending)
+            if processed_article
+        ]
 
-                    # Progress logging for large batches
-                    if i % 10 == 0:
-                        logger.info(f"Processed {i}/{len(articles)} articles")
+        self.article_store.save_processed(processed)
 
-            except Exception as e:
-                logger.error(f"Error processing article {i}: {e}")
-                continue
+        # Merge stored and freshly processed results, keeping ranking order
+        results = self.article_store.get_processed(
+            [ArticleStore.article_key(article) for article in articles]
+        )
+        for processed_article in processed:
+            results[processed_article['guid']] = processed_article
 
-        logger.info(f"✅ Successfully processed {len(processed)} articles")
-        return processed
+        ordered = []
+        for article in articles:
+            processed_article = results.pop(ArticleStore.article_key(article), None)
+            if processed_article:
+                ordered.append(processed_article)
 
-    async def get_daily_digest(self):
-        """Generate the daily news digest"""
+        logger.info(f"✅ Successfully processed {len(processed)} articles, {len(ordered) - len(processed)} from store")
+        return ordered
+
+    async def refresh_snapshot(self):
+        """Refresh the snapshot, joining a refresh that is already running"""
+        return await self.snapshot_flight.do('snapshot', self.build_snapshot)
+
+    async def build_snapshot(self):
+        """Fetch, rank and process articles into a fresh snapshot"""
         try:
             start_time = datetime.now()
-            logger.info("📰 Generating daily digest...")
+            logger.info("🔄 Refreshing article snapshot...")
 
-            # Fetch latest news
-            articles = self.news_aggregator.get_latest_news()
+            # Fetching is blocking network I/O, keep it off the event loop
+            articles = await asyncio.to_thread(self.news_aggregator.get_latest_news)
 
             if not articles:
                 logger.warning("No articles fetched from news sources")
-                return self.formatter.format_no_news_message()
+                return self.snapshot
 
             logger.info(f"Fetched {len(articles)} articles from news sources")
 
-            # Process with AI
             processed_articles = await self.process_news_articles(articles)
 
-            if not processed_articles:
-                logger.warning("No articles successfully processed")
-                return self.formatter.format_no_news_message()
-
-            # Format digest
-            digest_message = self.formatter.format_daily_digest(processed_articles)
+            if processed_articles:
+                self.snapshot = processed_articles
+                self.snapshot_built_at = datetime.now()
+                self.digest_flights.invalidate()
 
             duration = (datetime.now() - start_time).total_seconds()
-            logger.info(f"✅ Daily digest generated in {duration:.1f}s")
+            logger.info(f"✅ Snapshot refreshed with {len(processed_articles)} articles in {duration:.1f}s")
+
+        except Exception as e:
+            logger.error(f"Error refreshing snapshot: {e}")
 
-            return digest_message
+        return self.snapshot
+
+    def has_fresh_snapshot(self, max_age_minutes=SNAPSHOT_MAX_AGE_MINUTES):
+        """Check whether the snapshot can be served without rebuilding"""
+        if self.snapshot is None:
+            return False
+        if max_age_minutes is None:
+            return True
+
+        age = (datetime.now() - self.snapshot_built_at).total_seconds()
+        return age <= max_age_minutes * 60
+
+    async def get_processed_articles(self, max_age_minutes=SNAPSHOT_MAX_AGE_MINUTES):
+        """Get processed articles from the snapshot, rebuilding it if too stale"""
+        if self.has_fresh_snapshot(max_age_minutes):
+            return self.snapshot
+
+        return await self.refresh_snapshot()
+
+    async def get_daily_digest(self):
+        """Generate the daily news digest as a list of message pages"""
+        try:
+            return await self.digest_flights.do('daily_digest', self.build_daily_digest)
 
         except Exception as e:
             logger.error(f"Error generating daily digest: {e}")
-            return self.formatter.format_error_message()
+            return [self.formatter.format_error_message()]
+
+    async def build_daily_digest(self):
+        """Build the daily digest pages (shared by concurrent callers)"""
+        start_time = datetime.now()
+        logger.info("📰 Generating daily digest...")
+
+        processed_articles = await self.get_processed_articles()
+
+        if not processed_articles:
+            logger.warning("No articles successfully processed")
+            return [self.formatter.format_no_news_message()]
+
+        # Format digest
+        with FORMAT_SECONDS.time(kind='daily_digest'):
+            pages = self.formatter.format_daily_digest(processed_articles)
+
+        duration = (datetime.now() - start_time).total_seconds()
+        logger.info(f"✅ Daily digest generated in {duration:.1f}s ({len(pages)} pages)")
+
+        return pages
 
     async def get_trending_news(self):
         """Get trending news by sentiment"""
         try:
-            logger.info("📊 Generating trending news...")
-
-            articles = self.news_aggregator.get_latest_news()
-            processed_articles = await self.process_news_articles(articles)
-
-            return self.formatter.format_trending_news(processed_articles)
+            return await self.digest_flights.do('trending_news', self.build_trending_news)
 
         except Exception as e:
             logger.error(f"Error generating trending news: {e}")
             return "❌ Sorry, couldn't fetch trending news right now. Please try again!"
 
-# Initialize bot instance
-try:
-    bot_instance = CryptoNewsBot()
-except Exception as e:
-    logger.error(f"Failed to initialize bot: {e}")
-    sys.exit(1)
+    async def build_trending_news(self):
+        """Build the trending news message (shared by concurrent callers)"""
+        logger.info("📊 Generating trending news...")
+
+        processed_articles = await self.get_processed_articles()
+
+        with FORMAT_SECONDS.time(kind='trending_news'):
+            return self.formatter.format_trending_news(processed_articles)
+
+    async def get_stats(self):
+        """User counters, activity, backoff, recent broadcasts and source health"""
+        stats = await self.adb.get_stats()
+        stats['broadcasts'] = await self.scheduler.outbox.get_history() if self.scheduler else []
+        stats['sources'] = self.news_aggregator.health.snapshot()
+        return stats
+
+# Bot instance, created in main() so worker processes can import this module
+bot_instance = None
 
 # Command Handlers
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -140,7 +229,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         logger.info(f"👋 New user started: {user.id} (@{user.username})")
 
         # Add user to database
-        bot_instance.db.add_user(
+        await bot_instance.adb.add_user(
             user.id, 
             user.username, 
             user.first_name, 
@@ -168,54 +257,30 @@ async def today(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     try:
         # Update user activity
-        bot_instance.db.update_last_active(user_id)
+        bot_instance.activity.touch(user_id)
 
-        # Send loading message
-        loading_msg = await update.message.reply_text("📊 Generating your crypto digest... Please wait!")
+        # Send loading message only when the digest has to be built inline
+        loading_msg = None
+        if not bot_instance.has_fresh_snapshot():
+            loading_msg = await update.message.reply_text("📊 Generating your crypto digest... Please wait!")
 
-        # Generate digest
-        digest = await bot_instance.get_daily_digest()
+        # Generate digest, already split into Telegram-sized pages
+        pages = await bot_instance.get_daily_digest()
 
-        # Split long messages if needed
-        if len(digest) > 4000:
-            # Split into parts
-            parts = []
-            current_part = ""
-
-            for line in digest.split('\n\n'):
-                if len(current_part + line + '\n\n') > 4000:
-                    if current_part:
-                        parts.append(current_part.strip())
-                    current_part = line + '\n\n'
-                else:
-                    current_part += line + '\n\n'
-
-            if current_part:
-                parts.append(current_part.strip())
-
-            # Delete loading message
+        if loading_msg:
             await loading_msg.delete()
 
-            # Send parts
-            for i, part in enumerate(parts):
-                await update.message.reply_text(
-                    part,
-                    parse_mode=ParseMode.MARKDOWN,
-                    disable_web_page_preview=True
-                )
-
-                # Small delay between parts
-                if i < len(parts) - 1:
-                    await asyncio.sleep(1)
-        else:
-            # Delete loading message and send digest
-            await loading_msg.delete()
+        for i, page in enumerate(pages):
             await update.message.reply_text(
-                digest,
+                page,
                 parse_mode=ParseMode.MARKDOWN,
                 disable_web_page_preview=True
             )
 
+            # Small delay between parts
+            if i < len(pages) - 1:
+                await asyncio.sleep(1)
+
         logger.info(f"📰 Digest sent to user {user_id}")
 
     except Exception as e:
@@ -234,13 +299,16 @@ async def hot(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     try:
-        bot_instance.db.update_last_active(user_id)
+        bot_instance.activity.touch(user_id)
 
-        loading_msg = await update.message.reply_text("🔥 Analyzing trending sentiment...")
+        loading_msg = None
+        if not bot_instance.has_fresh_snapshot():
+            loading_msg = await update.message.reply_text("🔥 Analyzing trending sentiment...")
 
         trending = await bot_instance.get_trending_news()
 
-        await loading_msg.delete()
+        if loading_msg:
+            await loading_msg.delete()
         await update.message.reply_text(
             trending,
             parse_mode=ParseMode.MARKDOWN,
@@ -265,10 +333,22 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     try:
-        bot_instance.db.update_last_active(user_id)
+        bot_instance.activity.touch(user_id)
+
+        args = context.args or []
 
-        # Check subscription status (simplified - assume subscribed by default)
-        settings_msg = bot_instance.formatter.format_settings_message(True)
+        # /settings time HH:MM [Timezone]
+        if args:
+            await update_delivery_time(update, args)
+            return
+
+        user = await bot_instance.adb.get_user(user_id)
+        if user:
+            settings_msg = bot_instance.formatter.format_settings_message(
+                user['subscribed'], user['digest_time'], user['timezone']
+            )
+        else:
+            settings_msg = bot_instance.formatter.format_settings_message(True)
 
         await update.message.reply_text(
             settings_msg,
@@ -281,19 +361,50 @@ async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "⚙️ Settings temporarily unavailable. Please try again!"
         )
 
+async def update_delivery_time(update: Update, args):
+    """Handle /settings time HH:MM [Timezone]"""
+    user = update.effective_user
+
+    parsed = parse_digest_time(args[1]) if len(args) >= 2 and args[0].lower() == 'time' else None
+    timezone = args[2] if len(args) >= 3 else 'UTC'
+
+    if parsed is None or get_timezone(timezone) is None:
+        await update.message.reply_text(
+            bot_instance.formatter.format_settings_usage(),
+            parse_mode=ParseMode.MARKDOWN
+        )
+        return
+
+    digest_time = f"{parsed[0]:02d}:{parsed[1]:02d}"
+
+    if not await bot_instance.adb.update_delivery_time(user.id, digest_time, timezone):
+        # User not in database yet, add them first
+        await bot_instance.adb.add_user(user.id, user.username, user.first_name, user.last_name)
+        await bot_instance.adb.update_delivery_time(user.id, digest_time, timezone)
+
+    await update.message.reply_text(
+        bot_instance.formatter.format_delivery_time_updated(digest_time, timezone),
+        parse_mode=ParseMode.MARKDOWN
+    )
+
+    logger.info(f"⏰ User {user.id} set delivery time to {digest_time} {timezone}")
+
 async def subscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /subscribe command"""
     user_id = update.effective_user.id
 
     try:
-        success = bot_instance.db.update_subscription(user_id, True)
+        success = await bot_instance.adb.update_subscription(user_id, True)
 
-        if success:
-            message = bot_instance.formatter.format_subscription_success()
-        else:
+        if not success:
             # User not in database, add them
             user = update.effective_user
-            bot_instance.db.add_user(user.id, user.username, user.first_name, user.last_name)
+            await bot_instance.adb.add_user(user.id, user.username, user.first_name, user.last_name)
+
+        user = await bot_instance.adb.get_user(user_id)
+        if user:
+            message = bot_instance.formatter.format_subscription_success(user['digest_time'], user['timezone'])
+        else:
             message = bot_instance.formatter.format_subscription_success()
 
         await update.message.reply_text(
@@ -314,7 +425,7 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
 
     try:
-        bot_instance.db.update_subscription(user_id, False)
+        await bot_instance.adb.update_subscription(user_id, False)
 
         message = bot_instance.formatter.format_unsubscribe_success()
 
@@ -334,7 +445,7 @@ async def unsubscribe(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /help command"""
     try:
-        bot_instance.db.update_last_active(update.effective_user.id)
+        bot_instance.activity.touch(update.effective_user.id)
 
         help_msg = bot_instance.formatter.format_help_message()
 
@@ -350,13 +461,37 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "ℹ️ Help is temporarily unavailable. Try /today for news or /settings for preferences!"
         )
 
+async def stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats command (admins only)"""
+    user_id = update.effective_user.id
+
+    if user_id not in ADMIN_USER_IDS:
+        await update.message.reply_text(
+            "🤖 Use /help to see what I can do, or /today for crypto news!"
+        )
+        return
+
+    try:
+        stats_msg = bot_instance.formatter.format_stats_message(await bot_instance.get_stats())
+
+        await update.message.reply_text(
+            stats_msg,
+            parse_mode=ParseMode.MARKDOWN
+        )
+
+    except Exception as e:
+        logger.error(f"Error in stats command for user {user_id}: {e}")
+        await update.message.reply_text(
+            "📊 Stats temporarily unavailable. Please try again!"
+        )
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle regular text messages"""
     try:
         message_text = update.message.text.lower() if update.message.text else ""
         user_id = update.effective_user.id
 
-        bot_instance.db.update_last_active(user_id)
+        bot_instance.activity.touch(user_id)
 
         # Smart responses based on message content
         if any(word in message_text for word in ['hi', 'hello', 'hey', 'start', 'help']):
@@ -377,7 +512,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         elif any(word in message_text for word in ['subscribe', 'daily', 'automatic']):
             response = (
                 "🔔 **Daily Digest Subscription:**\n\n"
-                "Use /subscribe to enable daily crypto news at 9 AM UTC!\n"
+                "Use /subscribe to enable daily crypto news, then /settings time to pick when it arrives!\n"
                 "Or try /today for instant news."
             )
         else:
@@ -400,6 +535,14 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "🤖 Use /help to see what I can do, or /today for crypto news!"
         )
 
+def timed(command, callback):
+    """Record a handler's latency under its command name"""
+    async def handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        with HANDLER_SECONDS.time(command=command):
+            return await callback(update, context)
+
+    return handler
+
 async def set_bot_commands(application):
     """Set bot command menu"""
     commands = [
@@ -416,6 +559,23 @@ async def set_bot_commands(application):
     except Exception as e:
         logger.error(f"Failed to set bot commands: {e}")
 
+async def shutdown_bot(application):
+    """Flush buffered state and release resources on shutdown"""
+    try:
+        if bot_instance.scheduler:
+            bot_instance.scheduler.stop()
+
+        flushed = await AsyncDatabase(bot_instance.activity).flush()
+        logger.info(f"Flushed activity for {flushed} users")
+
+        bot_instance.ai_processor.close()
+        bot_instance.news_aggregator.close()
+        shutdown_db_executor()
+        close_all()
+        logger.info("✅ Shutdown complete")
+    except Exception as e:
+        logger.error(f"Error during shutdown: {e}")
+
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle errors"""
     logger.error(f"Update {update} caused error {context.error}")
@@ -431,10 +591,19 @@ async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 def main():
     """Main function to run the bot"""
+    global bot_instance
+
     if not TELEGRAM_BOT_TOKEN:
         logger.error("❌ TELEGRAM_BOT_TOKEN not found in environment variables!")
         sys.exit(1)
 
+    # Initialize bot instance
+    try:
+        bot_instance = CryptoNewsBot()
+    except Exception as e:
+        logger.error(f"Failed to initialize bot: {e}")
+        sys.exit(1)
+
     logger.info(f"🤖 Starting Crypto News Bot V2.0...")
     logger.info(f"🔗 Webhook URL: {RENDER_URL}")
     logger.info(f"🌐 Port: {PORT}")
@@ -444,13 +613,14 @@ def main():
         application = Application.builder().token(TELEGRAM_BOT_TOKEN).build()
 
         # Add handlers
-        application.add_handler(CommandHandler("start", start))
-        application.add_handler(CommandHandler("today", today))
-        application.add_handler(CommandHandler("hot", hot))
-        application.add_handler(CommandHandler("settings", settings))
-        application.add_handler(CommandHandler("subscribe", subscribe))
-        application.add_handler(CommandHandler("unsubscribe", unsubscribe))
-        application.add_handler(CommandHandler("help", help_command))
+        application.add_handler(CommandHandler("start", timed("start", start)))
+        application.add_handler(CommandHandler("today", timed("today", today)))
+        application.add_handler(CommandHandler("hot", timed("hot", hot)))
+        application.add_handler(CommandHandler("settings", timed("settings", settings)))
+        application.add_handler(CommandHandler("subscribe", timed("subscribe", subscribe)))
+        application.add_handler(CommandHandler("unsubscribe", timed("unsubscribe", unsubscribe)))
+        application.add_handler(CommandHandler("help", timed("help", help_command)))
+        application.add_handler(CommandHandler("stats", timed("stats", stats)))
 
         # Handle regular messages
         application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
@@ -460,6 +630,7 @@ def main():
 
         # Set bot commands menu
         application.post_init = set_bot_commands
+        application.post_shutdown = shutdown_bot
 
         # Initialize scheduler
         try:
@@ -473,7 +644,9 @@ def main():
         if RENDER_URL and "render" in RENDER_URL:
             # Production: Use webhook on Render
             logger.info("🚀 Starting bot with webhook (Production)")
-            application.run_webhook(
+            # Serves /metrics on the same port
+            run_webhook(
+                application,
                 listen="0.0.0.0",
                 port=PORT,
                 webhook_url=f"{RENDER_URL}/",
@@ -0,0 +1,161 @@
+"""Minimal Prometheus-style metrics registry.
+
+Counters, gauges and histograms with labels, rendered in the Prometheus
+text exposition format by `render()`. Kept dependency-free; the bot
+serves the output on /metrics next to the Telegram webhook.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds; covers fast in-memory stages up to slow feed fetches
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{escape_label(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value))
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple((name, labels[name]) for name in self.labelnames)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for name, labels, value in self.samples():
+            lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    def samples(self):
+        with self.lock:
+            return [(self.name, key, value) for key, value in self.values.items()]
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self.lock:
+            counts, total = self.values.get(key, ([0] * len(self.buckets), 0.0))
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+            self.values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the duration of a with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        samples = []
+        with self.lock:
+            for key, (counts, total) in self.values.items():
+                for bound, count in zip(self.buckets, counts):
+                    samples.append((f"{self.name}_bucket", key + (('le', format_value(bound)),), count))
+                samples.append((f"{self.name}_sum", key, total))
+                samples.append((f"{self.name}_count", key, counts[-1]))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+        self.lock = threading.Lock()
+
+    def register(self, metric):
+        with self.lock:
+            self.metrics.append(metric)
+
+    def render(self):
+        """All metrics in Prometheus text format"""
+        with self.lock:
+            metrics = list(self.metrics)
+        return '\n'.join(metric.render() for metric in metrics) + '\n'
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Fetching
+FETCH_SECONDS = Histogram('cryptobot_fetch_seconds', 'Feed fetch and parse latency', ['source'])
+FETCH_RESULTS = Counter('cryptobot_fetch_total', 'Feed fetches by outcome (ok, not_modified, error, skipped)',
+                        ['source', 'outcome'])
+
+# Pipeline
+PIPELINE_ARTICLES = Counter('cryptobot_pipeline_articles_total', 'Articles leaving each pipeline stage', ['stage'])
+DEDUP_RATIO = Gauge('cryptobot_dedup_ratio', 'Share of fetched articles dropped as duplicates in the last run')
+AI_SECONDS = Histogram('cryptobot_ai_batch_seconds', 'AI processing time per article batch')
+AI_ARTICLES = Counter('cryptobot_ai_articles_total', 'Articles analyzed, by cache use (hit, miss)', ['cache'])
+FORMAT_SECONDS = Histogram('cryptobot_format_seconds', 'Message formatting time', ['kind'],
+                           buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1))
+
+# Broadcasts
+BROADCAST_MESSAGES = Counter('cryptobot_broadcast_chats_total', 'Broadcast recipients by outcome', ['outcome'])
+BROADCAST_SEND_RATE = Gauge('cryptobot_broadcast_rate', 'Delivered chats per second in the last broadcast batch')
+BROADCAST_RETRIES = Counter('cryptobot_broadcast_retries_total', 'Send retries during broadcasts')
+
+# Handlers
+HANDLER_SECONDS = Histogram('cryptobot_handler_seconds', 'Command handler latency', ['command'])
+
+
+def render():
+    return REGISTRY.render()
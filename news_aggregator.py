@@ -1,43 +1,143 @@
-import feedparser
+import multiprocessing
 import requests
+import urllib3
 from datetime import datetime, timedelta
 import logging
+import threading
 import time
-from bs4 import BeautifulSoup
-from config import NEWS_SOURCES, MAX_ARTICLES_PER_SOURCE, TOTAL_ARTICLES_LIMIT
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlparse
+from keyword_matcher import KeywordMatcher, load_keyword_tables
+from dedup import TitleDeduplicator
+from feed_parser import parse_feed
+from source_health import SourceHealth
+import pipeline
+from metrics import FETCH_SECONDS, FETCH_RESULTS, PIPELINE_ARTICLES, DEDUP_RATIO
+from config import (
+    NEWS_SOURCES, MAX_ARTICLES_PER_SOURCE, TOTAL_ARTICLES_LIMIT,
+    FETCH_MAX_WORKERS, PER_HOST_MIN_INTERVAL, FEED_PARSE_WORKERS, PRIORITY_SOURCES
+)
 
 logger = logging.getLogger(__name__)
 
 class NewsAggregator:
-    def __init__(self):
-        self.sources = NEWS_SOURCES
+    def __init__(self, sources=None, max_articles_per_source=MAX_ARTICLES_PER_SOURCE,
+                 min_host_interval=PER_HOST_MIN_INTERVAL, parse_workers=FEED_PARSE_WORKERS):
+        self.sources = sources if sources is not None else NEWS_SOURCES
+        self.max_articles_per_source = max_articles_per_source
+        self.min_host_interval = min_host_interval
+        self.parse_workers = parse_workers
         self.session = requests.Session()
         self.session.headers.update({
             'User-Agent': 'CryptoNewsBot/1.0 (Telegram Bot)'
         })
 
-    def clean_text(self, text):
-        """Clean HTML and format text"""
-        if not text:
-            return ""
+        # Per-host politeness: one request at a time per host, spaced out
+        self._host_locks = {}
+        self._host_last_request = {}
+        self._host_locks_guard = threading.Lock()
 
+        # Conditional GET cache: source_name -> {'etag', 'last_modified', 'articles'}
+        self.feed_cache = {}
+
+        # Latency, error streaks and circuit breakers per source
+        self.health = SourceHealth()
+
+        # Keywords that increase article importance, compiled once
+        self.keyword_matcher = KeywordMatcher(load_keyword_tables()['ranking_keywords'])
+
+        # Feed parser processes, created on first use
+        self.parse_pool = None
+        self._parse_pool_guard = threading.Lock()
+
+    def wait_for_host(self, url):
+        """Block until a request to this URL's host is allowed, return the host lock"""
+        host = urlparse(url).netloc
+
+        with self._host_locks_guard:
+            lock = self._host_locks.setdefault(host, threading.Lock())
+
+        lock.acquire()
+        elapsed = time.monotonic() - self._host_last_request.get(host, 0)
+        if elapsed < self.min_host_interval:
+            time.sleep(self.min_host_interval - elapsed)
+
+        return host, lock
+
+    def release_host(self, host, lock):
+        """Record the request time and let the next request to this host go"""
+        self._host_last_request[host] = time.monotonic()
+        lock.release()
+
+    def fetch_source(self, source_name, url):
+        """Fetch a single source while holding its per-host slot"""
+        host, lock = self.wait_for_host(url)
         try:
-            # Remove HTML tags
-            soup = BeautifulSoup(text, 'html.parser')
-            clean_text = soup.get_text()
+            with FETCH_SECONDS.time(source=source_name):
+                return self.fetch_rss_feed(source_name, url)
+        finally:
+            self.release_host(host, lock)
+
+    def get_parse_pool(self):
+        """Get the feed parser process pool, or None to parse inline"""
+        with self._parse_pool_guard:
+            if self.parse_pool is None and self.parse_workers > 0:
+                # Workers fork from a clean server process, not from this threaded one
+                self.parse_pool = ProcessPoolExecutor(
+                    max_workers=self.parse_workers,
+                    mp_context=multiprocessing.get_context('forkserver')
+                )
+                logger.info(f"Feed parser pool started with {self.parse_workers} workers")
+
+            return self.parse_pool
+
+    def parse(self, content, source_name):
+        """Parse raw feed bytes on the parser pool, returns parse_feed's result"""
+        pool = self.get_parse_pool()
+        if pool is None:
+            return parse_feed(content, source_name, self.max_articles_per_source)
 
-            # Clean whitespace
-            clean_text = ' '.join(clean_text.split())
+        try:
+            return pool.submit(parse_feed, content, source_name, self.max_articles_per_source).result()
+
+        except BrokenProcessPool:
+            # A worker died; replace the pool for later feeds and parse this one here
+            logger.error(f"Feed parser pool broke while parsing {source_name}, restarting it")
+            with self._parse_pool_guard:
+                if self.parse_pool is pool:
+                    self.parse_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return parse_feed(content, source_name, self.max_articles_per_source)
+
+    def close(self):
+        """Shut down the feed parser pool"""
+        with self._parse_pool_guard:
+            if self.parse_pool is not None:
+                self.parse_pool.shutdown(wait=False, cancel_futures=True)
+                self.parse_pool = None
+
+    def read_body(self, response, deadline):
+        """Read a streamed response body, giving up at the deadline"""
+        chunks = []
+        while True:
+            # read1 returns whatever has arrived, so a trickling body hits the deadline
+            try:
+                chunk = response.raw.read1(64 * 1024, decode_content=True)
 
-            # Limit length
-            if len(clean_text) > 500:
-                clean_text = clean_text[:500] + "..."
+            # Reading raw bypasses requests, which would wrap these
+            except urllib3.exceptions.ReadTimeoutError as e:
+                raise requests.Timeout(e)
+            except urllib3.exceptions.HTTPError as e:
+                raise requests.ConnectionError(e)
 
-            return clean_text
+            if not chunk:
+                break
+            chunks.append(chunk)
+            if time.monotonic() > deadline:
+                raise requests.Timeout("Feed body not received before the deadline")
 
-        except Exception as e:
-            logger.error(f"Text cleaning error: {e}")
-            return text[:200] if text else ""
+        return b''.join(chunks)
 
     def fetch_rss_feed(self, source_name, url):
         """Fetch and parse RSS feed"""
@@ -46,49 +146,76 @@ class NewsAggregator:
         try:
             logger.info(f"Fetching from {source_name}: {url}")
 
-            # Set timeout for RSS parsing
-            feedparser._parse_date = lambda x: None  # Skip date parsing issues
+            # Send validators from the last successful fetch
+            cached = self.feed_cache.get(source_name)
+            headers = {}
+            if cached:
+                if cached.get('etag'):
+                    headers['If-None-Match'] = cached['etag']
+                if cached.get('last_modified'):
+                    headers['If-Modified-Since'] = cached['last_modified']
+
+            # The timeout bounds each socket operation and the whole download
+            timeout = self.health.timeout_for(source_name)
+            start = time.monotonic()
 
-            feed = feedparser.parse(url)
+            with self.session.get(url, headers=headers, timeout=timeout, stream=True) as response:
+                # Feed unchanged since the last fetch, skip parsing entirely
+                if response.status_code == 304 and cached:
+                    self.health.record_success(source_name)
+                    logger.info(f"{source_name} not modified, reusing {len(cached['articles'])} cached articles")
+                    FETCH_RESULTS.inc(source=source_name, outcome='not_modified')
+                    return list(cached['articles'])
 
-            if feed.bozo and feed.bozo_exception:
-                logger.warning(f"RSS parsing warning for {source_name}: {feed.bozo_exception}")
+                response.raise_for_status()
+                content = self.read_body(response, start + timeout)
 
-            if not hasattr(feed, 'entries') or not feed.entries:
+            self.health.record_success(source_name, time.monotonic() - start)
+
+            feed_title, warning, entries = self.parse(content, source_name)
+
+            if warning:
+                logger.warning(f"RSS parsing warning for {source_name}: {warning}")
+
+            if not entries:
                 logger.warning(f"No entries found for {source_name}")
                 return []
 
-            for i, entry in enumerate(feed.entries[:MAX_ARTICLES_PER_SOURCE]):
-                try:
-                    # Extract article data
-                    article = {
-                        'title': self.clean_text(getattr(entry, 'title', 'No Title')),
-                        'summary': self.clean_text(getattr(entry, 'summary', '') or getattr(entry, 'description', '')),
-                        'link': getattr(entry, 'link', ''),
-                        'published': getattr(entry, 'published', ''),
-                        'source_name': source_name,
-                        'source_title': getattr(feed.feed, 'title', source_name),
-                        'guid': getattr(entry, 'id', f"{source_name}_{i}"),
-                        'fetched_at': datetime.now().isoformat()
-                    }
-
-                    # Skip if no title or link
-                    if not article['title'] or article['title'] == 'No Title':
-                        continue
-                    if not article['link']:
-                        continue
-
-                    articles.append(article)
-
-                except Exception as e:
-                    logger.error(f"Error processing entry from {source_name}: {e}")
-                    continue
+            # Merge the parsed tuples into article dicts
+            fetched_at = datetime.now().isoformat()
+            for title, summary, link, published, guid in entries:
+                articles.append({
+                    'title': title,
+                    'summary': summary,
+                    'link': link,
+                    'published': published,
+                    'source_name': source_name,
+                    'source_title': feed_title,
+                    'guid': guid,
+                    'fetched_at': fetched_at
+                })
+
+            # Remember validators so the next poll can be conditional
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self.feed_cache[source_name] = {
+                    'etag': etag,
+                    'last_modified': last_modified,
+                    'articles': articles
+                }
+            else:
+                self.feed_cache.pop(source_name, None)
 
             logger.info(f"Successfully fetched {len(articles)} articles from {source_name}")
-            return articles
+            FETCH_RESULTS.inc(source=source_name, outcome='ok')
+            return list(articles)
 
         except Exception as e:
+            # Network, HTTP and parse errors all count toward the source's circuit
+            self.health.record_failure(source_name, e)
             logger.error(f"Error fetching RSS from {source_name}: {e}")
+            FETCH_RESULTS.inc(source=source_name, outcome='error')
             return []
 
     def remove_duplicates(self, articles):
@@ -96,104 +223,100 @@ class NewsAggregator:
         if not articles:
             return []
 
-        unique_articles = []
-        seen_titles = set()
-
-        for article in articles:
-            title = article['title'].lower().strip()
-
-            # Create a normalized title for comparison
-            title_words = set(title.split())
+        # More than DEDUP_SIMILARITY_THRESHOLD of words in common counts as duplicate
+        unique_articles = TitleDeduplicator().filter(articles)
 
-            # Check if we've seen a very similar title
-            is_duplicate = False
-            for seen_title in seen_titles:
-                seen_words = set(seen_title.split())
+        logger.info(f"Removed {len(articles) - len(unique_articles)} duplicate articles")
+        return unique_articles
 
-                # If more than 70% of words are the same, consider it duplicate
-                if len(title_words) > 0 and len(seen_words) > 0:
-                    common_words = title_words.intersection(seen_words)
-                    similarity = len(common_words) / max(len(title_words), len(seen_words))
+    def score_article(self, article):
+        """Relevance score based on keywords and source"""
+        score = 0
 
-                    if similarity > 0.7:
-                        is_duplicate = True
-                        break
+        # Score based on keyword presence
+        score += 3 * len(self.keyword_matcher.find_all(article['title']))  # Title matches are more important
+        score += len(self.keyword_matcher.find_all(article['summary']))
 
-            if not is_duplicate:
-                seen_titles.add(title)
-                unique_articles.append(article)
+        # Boost score for certain sources
+        if article['source_name'] in PRIORITY_SOURCES:
+            score += 2
 
-        logger.info(f"Removed {len(articles) - len(unique_articles)} duplicate articles")
-        return unique_articles
+        return score
 
     def rank_articles(self, articles):
         """Simple ranking based on keywords and recency"""
         if not articles:
             return []
 
-        # Keywords that increase article importance
-        important_keywords = [
-            'bitcoin', 'btc', 'ethereum', 'eth', 'crypto', 'blockchain',
-            'defi', 'nft', 'regulation', 'sec', 'etf', 'adoption',
-            'price', 'market', 'trading', 'investment', 'bull', 'bear'
-        ]
-
         for article in articles:
-            score = 0
-            title_lower = article['title'].lower()
-            summary_lower = article['summary'].lower()
-
-            # Score based on keyword presence
-            for keyword in important_keywords:
-                if keyword in title_lower:
-                    score += 3  # Title matches are more important
-                if keyword in summary_lower:
-                    score += 1
-
-            # Boost score for certain sources
-            if article['source_name'] in ['coindesk', 'cointelegraph']:
-                score += 2
-
-            article['relevance_score'] = score
+            article['relevance_score'] = self.score_article(article)
 
         # Sort by relevance score (descending)
         sorted_articles = sorted(articles, key=lambda x: x.get('relevance_score', 0), reverse=True)
 
         return sorted_articles
 
-    def get_latest_news(self):
-        """Main method to get processed news articles"""
-        all_articles = []
+    def iter_articles(self):
+        """Yield articles source by source as each fetch completes"""
+        max_workers = max(1, min(FETCH_MAX_WORKERS, len(self.sources)))
+        executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='fetch')
 
-        # Fetch from all sources
-        for source_name, url in self.sources.items():
-            try:
-                articles = self.fetch_rss_feed(source_name, url)
-                all_articles.extend(articles)
+        try:
+            futures = {}
+            for source_name, url in self.sources.items():
+                # Circuit open: keep the failing source off the critical path
+                if not self.health.allow(source_name):
+                    cached = self.feed_cache.get(source_name)
+                    logger.info(f"Skipping {source_name}, circuit open")
+                    FETCH_RESULTS.inc(source=source_name, outcome='skipped')
+                    if cached:
+                        yield from list(cached['articles'])
+                    continue
 
-                # Small delay between requests to be respectful
-                time.sleep(0.5)
+                futures[executor.submit(self.fetch_source, source_name, url)] = source_name
 
-            except Exception as e:
-                logger.error(f"Failed to fetch from {source_name}: {e}")
-                continue
+            for future in as_completed(futures):
+                source_name = futures[future]
+                try:
+                    articles = future.result()
 
-        if not all_articles:
-            logger.warning("No articles fetched from any source")
-            return []
+                except Exception as e:
+                    logger.error(f"Failed to fetch from {source_name}: {e}")
+                    continue
+
+                yield from articles
+
+        finally:
+            # A consumer that stops early should not wait for remaining sources
+            executor.shutdown(wait=False, cancel_futures=True)
 
-        logger.info(f"Total articles fetched: {len(all_articles)}")
+    def stream_latest_news(self, limit=TOTAL_ARTICLES_LIMIT, stats=None):
+        """Streaming pipeline: fetch -> dedupe -> score -> top `limit` articles"""
+        stats = stats if stats is not None else {}
 
-        # Remove duplicates
-        unique_articles = self.remove_duplicates(all_articles)
+        articles = pipeline.tally(self.iter_articles(), stats, 'fetched')
+        articles = pipeline.tally(pipeline.dedupe(articles), stats, 'unique')
+        articles = pipeline.score(articles, self.score_article)
 
-        # Rank articles by relevance
-        ranked_articles = self.rank_articles(unique_articles)
+        return pipeline.top_k(articles, limit)
 
-        # Limit total articles
-        final_articles = ranked_articles[:TOTAL_ARTICLES_LIMIT]
+    def get_latest_news(self):
+        """Main method to get processed news articles"""
+        stats = {}
+        final_articles = list(self.stream_latest_news(TOTAL_ARTICLES_LIMIT, stats))
+
+        if not stats.get('fetched'):
+            logger.warning("No articles fetched from any source")
+            return []
 
+        logger.info(f"Total articles fetched: {stats['fetched']}")
+        logger.info(f"Removed {stats['fetched'] - stats['unique']} duplicate articles")
         logger.info(f"Final processed articles: {len(final_articles)}")
+
+        PIPELINE_ARTICLES.inc(stats['fetched'], stage='fetched')
+        PIPELINE_ARTICLES.inc(stats['unique'], stage='unique')
+        PIPELINE_ARTICLES.inc(len(final_articles), stage='selected')
+        DEDUP_RATIO.set(1 - stats['unique'] / stats['fetched'])
         return final_articles
 
     def get_article_summary(self, article):
@@ -0,0 +1,309 @@
+import json
+import logging
+from db_connection import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastOutbox:
+    """SQLite-backed outbox recording one delivery row per (digest_id, user_id).
+
+    A digest's messages and recipients are written before sending starts
+    (recipients page by page, while the digest is 'queuing');
+    senders claim pending rows in batches and mark them sent or failed, so a
+    restarted process resumes where it stopped instead of dropping or
+    re-sending the whole broadcast. Rows left 'sending' by a crash are put
+    back to 'pending', so at most one in-flight batch can be sent twice.
+    A digest whose content Telegram rejects is 'aborted' and not resumed.
+    """
+
+    def __init__(self, db_path='users.db'):
+        self.db_path = db_path
+        self.connection = get_connection(db_path)
+        self.init_db()
+
+    def init_db(self):
+        """Initialize outbox tables"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS digests (
+                        digest_id TEXT PRIMARY KEY,
+                        slot INTEGER,
+                        messages TEXT NOT NULL,
+                        status TEXT DEFAULT 'pending',
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        finished_at TIMESTAMP
+                    )
+                ''')
+
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS outbox (
+                        digest_id TEXT NOT NULL,
+                        user_id INTEGER NOT NULL,
+                        status TEXT DEFAULT 'pending',
+                        attempts INTEGER DEFAULT 0,
+                        error TEXT,
+                        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                        PRIMARY KEY (digest_id, user_id)
+                    )
+                ''')
+
+                # Running totals per digest for broadcast history
+                columns = {row[1] for row in cursor.execute('PRAGMA table_info(digests)')}
+                for column in ('recipients', 'sent', 'failed'):
+                    if column not in columns:
+                        cursor.execute(f'ALTER TABLE digests ADD COLUMN {column} INTEGER DEFAULT 0')
+
+                # Claiming walks pending rows of one digest in user_id order
+                cursor.execute('''
+                    CREATE INDEX IF NOT EXISTS idx_outbox_status
+                    ON outbox(digest_id, status, user_id)
+                ''')
+
+                logger.info("Broadcast outbox initialized successfully")
+
+        except Exception as e:
+            logger.error(f"Outbox initialization error: {e}")
+
+    def create_digest(self, digest_id, slot, messages):
+        """Record a digest in 'queuing' state; returns False if it already exists"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR IGNORE INTO digests (digest_id, slot, messages, status)
+                    VALUES (?, ?, ?, 'queuing')
+                ''', (digest_id, slot, json.dumps(messages)))
+
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error creating digest {digest_id}: {e}")
+            return False
+
+    def enqueue(self, digest_id, user_ids):
+        """Add a page of recipients to a digest (idempotent)"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    INSERT OR IGNORE INTO outbox (digest_id, user_id) VALUES (?, ?)
+                ''', ((digest_id, user_id) for user_id in user_ids))
+
+                cursor.execute('''
+                    UPDATE digests SET recipients = recipients + ? WHERE digest_id = ?
+                ''', (cursor.rowcount, digest_id))
+
+        except Exception as e:
+            logger.error(f"Error queuing recipients for {digest_id}: {e}")
+            raise
+
+    def last_enqueued(self, digest_id):
+        """Highest user ID queued for a digest, where paging resumes after a restart"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('SELECT MAX(user_id) FROM outbox WHERE digest_id = ?', (digest_id,))
+                return cursor.fetchone()[0] or 0
+
+        except Exception as e:
+            logger.error(f"Error reading queue position for {digest_id}: {e}")
+            return 0
+
+    def mark_queued(self, digest_id, recipients):
+        """All recipients are queued; the digest is ready to send"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE digests SET status = 'pending'
+                    WHERE digest_id = ? AND status = 'queuing'
+                ''', (digest_id,))
+
+            logger.info(f"Digest {digest_id} queued for {recipients} users")
+
+        except Exception as e:
+            logger.error(f"Error marking digest {digest_id} queued: {e}")
+
+    def get_digest(self, digest_id):
+        """Get a digest's slot and status, or None if it was never created"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('SELECT slot, status FROM digests WHERE digest_id = ?', (digest_id,))
+                row = cursor.fetchone()
+                return {'slot': row[0], 'status': row[1]} if row else None
+
+        except Exception as e:
+            logger.error(f"Error getting digest {digest_id}: {e}")
+            return None
+
+    def get_messages(self, digest_id):
+        """Get the messages of a queued digest"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('SELECT messages FROM digests WHERE digest_id = ?', (digest_id,))
+                row = cursor.fetchone()
+                return json.loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.error(f"Error getting digest {digest_id}: {e}")
+            return None
+
+    def claim_batch(self, digest_id, limit):
+        """Atomically move up to `limit` pending rows to 'sending' and return their user IDs"""
+        try:
+            # Write lock up front so concurrent senders never claim the same rows
+            with self.connection.transaction(immediate=True) as cursor:
+                cursor.execute('''
+                    SELECT user_id FROM outbox
+                    WHERE digest_id = ? AND status = 'pending'
+                    ORDER BY user_id LIMIT ?
+                ''', (digest_id, limit))
+                user_ids = [row[0] for row in cursor.fetchall()]
+
+                cursor.executemany('''
+                    UPDATE outbox
+                    SET status = 'sending', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP
+                    WHERE digest_id = ? AND user_id = ?
+                ''', ((digest_id, user_id) for user_id in user_ids))
+
+                return user_ids
+
+        except Exception as e:
+            logger.error(f"Error claiming outbox batch for {digest_id}: {e}")
+            return []
+
+    def mark_sent(self, digest_id, user_ids):
+        """Mark rows as delivered"""
+        self.set_status(digest_id, [(user_id, None) for user_id in user_ids], 'sent')
+
+    def mark_failed(self, digest_id, failures):
+        """Mark rows as failed, with the error per user"""
+        self.set_status(digest_id, list(failures.items()), 'failed')
+
+    def set_status(self, digest_id, rows, status):
+        if not rows:
+            return
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.executemany('''
+                    UPDATE outbox
+                    SET status = ?, error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE digest_id = ? AND user_id = ? AND status != ?
+                ''', ((status, error, digest_id, user_id, status) for user_id, error in rows))
+
+                if status in ('sent', 'failed'):
+                    cursor.execute(f'''
+                        UPDATE digests SET {status} = {status} + ? WHERE digest_id = ?
+                    ''', (cursor.rowcount, digest_id))
+
+        except Exception as e:
+            logger.error(f"Error updating outbox for {digest_id}: {e}")
+
+    def finish_digest(self, digest_id):
+        """Mark a digest as done once no pending rows remain"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE digests SET status = 'done', finished_at = CURRENT_TIMESTAMP
+                    WHERE digest_id = ? AND status = 'pending' AND NOT EXISTS (
+                        SELECT 1 FROM outbox
+                        WHERE outbox.digest_id = digests.digest_id AND status IN ('pending', 'sending')
+                    )
+                ''', (digest_id,))
+
+                return cursor.rowcount > 0
+
+        except Exception as e:
+            logger.error(f"Error finishing digest {digest_id}: {e}")
+            return False
+
+    def abort_digest(self, digest_id, error):
+        """Give up on a digest whose content Telegram rejects; unsent rows become failed"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE outbox SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE digest_id = ? AND status IN ('pending', 'sending')
+                ''', (error, digest_id))
+
+                cursor.execute('''
+                    UPDATE digests
+                    SET status = 'aborted', failed = failed + ?, finished_at = CURRENT_TIMESTAMP
+                    WHERE digest_id = ?
+                ''', (cursor.rowcount, digest_id))
+
+            logger.error(f"Digest {digest_id} aborted: {error}")
+
+        except Exception as e:
+            logger.error(f"Error aborting digest {digest_id}: {e}")
+
+    def recover(self):
+        """After a restart: requeue rows left 'sending' and return unfinished digest IDs"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    UPDATE outbox SET status = 'pending', updated_at = CURRENT_TIMESTAMP
+                    WHERE status = 'sending'
+                ''')
+                requeued = cursor.rowcount
+
+                cursor.execute('''
+                    SELECT digest_id FROM digests
+                    WHERE status NOT IN ('done', 'aborted')
+                    ORDER BY created_at
+                ''')
+                digest_ids = [row[0] for row in cursor.fetchall()]
+
+                if digest_ids:
+                    logger.info(f"Resuming {len(digest_ids)} unfinished digests ({requeued} rows requeued)")
+                return digest_ids
+
+        except Exception as e:
+            logger.error(f"Error recovering outbox: {e}")
+            return []
+
+    def get_history(self, limit=5):
+        """Most recent digests with their delivery totals"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    SELECT digest_id, slot, status, recipients, sent, failed, created_at, finished_at
+                    FROM digests
+                    ORDER BY created_at DESC LIMIT ?
+                ''', (limit,))
+
+                return [
+                    {
+                        'digest_id': row[0],
+                        'slot': row[1],
+                        'status': row[2],
+                        'recipients': row[3],
+                        'sent': row[4],
+                        'failed': row[5],
+                        'created_at': row[6],
+                        'finished_at': row[7]
+                    }
+                    for row in cursor.fetchall()
+                ]
+
+        except Exception as e:
+            logger.error(f"Error getting broadcast history: {e}")
+            return []
+
+    def prune(self, retention_days):
+        """Delete finished digests and their rows older than the retention window"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM outbox WHERE digest_id IN (
+                        SELECT digest_id FROM digests
+                        WHERE status IN ('done', 'aborted') AND created_at < datetime('now', ?)
+                    )
+                ''', (f'-{int(retention_days)} days',))
+
+                cursor.execute('''
+                    DELETE FROM digests
+                    WHERE status IN ('done', 'aborted') AND created_at < datetime('now', ?)
+                ''', (f'-{int(retention_days)} days',))
+
+        except Exception as e:
+            logger.error(f"Error pruning outbox: {e}")
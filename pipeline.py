@@ -0,0 +1,42 @@
+"""Composable streaming stages for the news pipeline.
+
+Each stage takes an iterable of articles and lazily yields articles, so
+dedup and scoring run on each source's articles as soon as its fetch
+completes. `top_k` still consumes every fetched article: the best
+candidates are only known once all sources are in.
+"""
+import heapq
+from dedup import TitleDeduplicator
+
+
+def tally(articles, stats, name):
+    """Count articles flowing through a point of the pipeline"""
+    stats.setdefault(name, 0)
+    for article in articles:
+        stats[name] += 1
+        yield article
+
+
+def dedupe(articles, deduplicator=None):
+    """Drop articles whose titles are near-duplicates of earlier ones"""
+    deduplicator = deduplicator or TitleDeduplicator()
+    for article in articles:
+        if not deduplicator.is_duplicate(article['title']):
+            yield article
+
+
+def score(articles, scorer):
+    """Attach a relevance score to each article"""
+    for article in articles:
+        article['relevance_score'] = scorer(article)
+        yield article
+
+
+def top_k(articles, k):
+    """Yield the k best scored articles, highest first.
+
+    Only k candidates are held in memory; ties keep arrival order like a
+    stable sort would.
+    """
+    yield from heapq.nlargest(k, articles, key=lambda article: article.get('relevance_score', 0))
+
@@ -1,9 +1,18 @@
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-import asyncio
+from apscheduler.triggers.interval import IntervalTrigger
 import logging
-from datetime import datetime
-from config import DIGEST_TIME_HOUR, DIGEST_TIME_MINUTE
+from datetime import datetime, timezone
+from config import (
+    SNAPSHOT_REFRESH_MINUTES, DELIVERY_SLOT_MINUTES, DATABASE_PATH,
+    OUTBOX_BATCH_SIZE, OUTBOX_RETENTION_DAYS, ACTIVITY_FLUSH_SECONDS, SUBSCRIBER_PAGE_SIZE,
+    AI_CACHE_RETENTION_DAYS
+)
+from broadcast import Broadcaster
+from delivery_time import slot_start
+from outbox import BroadcastOutbox
+from async_database import AsyncDatabase
+from metrics import BROADCAST_MESSAGES, BROADCAST_SEND_RATE, BROADCAST_RETRIES
 
 logger = logging.getLogger(__name__)
 
@@ -12,73 +21,148 @@ class DigestScheduler:
         self.bot = bot
         self.news_processor = news_processor
         self.scheduler = AsyncIOScheduler()
+        self.broadcaster = Broadcaster(bot)
+        self.outbox = AsyncDatabase(BroadcastOutbox(DATABASE_PATH))
         self.is_running = False
 
-    async def send_daily_digest(self):
-        """Send daily digest to all subscribed users"""
+    async def send_slot_digest(self, slot):
+        """Send the digest to users whose delivery time falls in a slot"""
+        # A late tick still belongs to the day its slot started on
+        await self.send_daily_digest(slot=slot, day=slot_start(slot))
+
+    async def send_daily_digest(self, slot=None, day=None):
+        """Send daily digest to subscribed users of a delivery slot (all if None)"""
         try:
-            start_time = datetime.now()
-            logger.info("Starting daily digest generation...")
+            # One digest per UTC day and slot; re-running it resumes instead of re-sending
+            day = (day or datetime.now(timezone.utc)).strftime('%Y-%m-%d')
+            digest_id = f"{day}-{'all' if slot is None else f'{slot:04d}'}"
 
-            # Generate digest
-            digest_message = await self.news_processor.get_daily_digest()
+            digest = await self.outbox.get_digest(digest_id)
 
-            if not digest_message:
-                logger.error("No digest message generated")
-                return
+            if digest is None:
+                # Skip building the digest when nobody is due
+                db = self.news_processor.adb
+                if not await db.get_subscriber_page(0, 1, slot):
+                    logger.info("No subscribed users found")
+                    return
+
+                logger.info("Starting daily digest generation...")
+
+                # Generate digest
+                pages = await self.news_processor.get_daily_digest()
 
-            # Get subscribed users
-            from database import UserDatabase
-            db = UserDatabase()
-            users = db.get_subscribed_users()
+                if not pages:
+                    logger.error("No digest message generated")
+                    return
 
-            if not users:
-                logger.info("No subscribed users found")
+                await self.outbox.create_digest(digest_id, slot, pages)
+                digest = {'slot': slot, 'status': 'queuing'}
+
+            if digest['status'] == 'aborted':
+                logger.warning(f"Digest {digest_id} was aborted, not sending it again")
                 return
 
-            logger.info(f"Sending daily digest to {len(users)} users...")
+            if digest['status'] == 'queuing':
+                await self.queue_recipients(digest_id, slot)
 
-            # Send to all users with error handling
-            success_count = 0
-            error_count = 0
+            await self.deliver_digest(digest_id)
 
-            for user_id in users:
-                try:
-                    await self.bot.send_message(
-                        chat_id=user_id,
-                        text=digest_message,
-                        parse_mode='Markdown',
-                        disable_web_page_preview=True
-                    )
-                    success_count += 1
+        except Exception as e:
+            logger.error(f"Critical error in daily digest: {e}")
+
+    async def queue_recipients(self, digest_id, slot):
+        """Copy subscribers into the outbox page by page, resuming after the last queued user"""
+        db = self.news_processor.adb
+        after_user_id = await self.outbox.last_enqueued(digest_id)
+        queued = 0
+
+        while True:
+            page = await db.get_subscriber_page(after_user_id, SUBSCRIBER_PAGE_SIZE, slot)
+            if not page:
+                break
+
+            await self.outbox.enqueue(digest_id, page)
+            queued += len(page)
+            after_user_id = page[-1]
+
+        await self.outbox.mark_queued(digest_id, queued)
 
-                    # Rate limiting - small delay between messages
-                    await asyncio.sleep(0.2)
+    async def deliver_digest(self, digest_id):
+        """Send a queued digest batch by batch from the outbox"""
+        start_time = datetime.now()
+        messages = await self.outbox.get_messages(digest_id)
 
-                except Exception as e:
-                    error_count += 1
-                    logger.error(f"Failed to send digest to user {user_id}: {e}")
+        if not messages:
+            logger.error(f"No messages stored for digest {digest_id}")
+            return
 
-                    # If user blocked bot, remove from subscriptions
-                    if "bot was blocked" in str(e).lower() or "chat not found" in str(e).lower():
-                        try:
-                            db.update_subscription(user_id, False)
-                            logger.info(f"Unsubscribed inactive user {user_id}")
-                        except:
-                            pass
+        db = self.news_processor.adb
 
-            # Log results
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
+        success_count = 0
+        error_count = 0
 
-            logger.info(f"Daily digest completed in {duration:.1f}s - Success: {success_count}, Errors: {error_count}")
+        logger.info(f"Sending digest {digest_id}...")
 
-            # Optional: Send admin notification if many errors
-            if error_count > success_count * 0.1:  # More than 10% errors
-                logger.warning(f"High error rate in daily digest: {error_count}/{len(users)}")
+        while True:
+            batch = await self.outbox.claim_batch(digest_id, OUTBOX_BATCH_SIZE)
+            if not batch:
+                break
+
+            # Send to the batch within Telegram's rate limits
+            result = await self.broadcaster.send_all(
+                batch,
+                messages,
+                parse_mode='Markdown',
+                disable_web_page_preview=True
+            )
+
+            # Checkpoint before claiming the next batch
+            await self.outbox.mark_sent(digest_id, result.delivered)
+            await self.outbox.mark_failed(digest_id, {**result.failed, **result.blocked, **result.rejected})
+
+            success_count += len(result.delivered)
+            error_count += len(result.blocked) + len(result.failed) + len(result.rejected)
+
+            BROADCAST_MESSAGES.inc(len(result.delivered), outcome='delivered')
+            BROADCAST_MESSAGES.inc(len(result.blocked), outcome='blocked')
+            BROADCAST_MESSAGES.inc(len(result.failed), outcome='failed')
+            BROADCAST_MESSAGES.inc(len(result.rejected), outcome='rejected')
+            BROADCAST_RETRIES.inc(result.retries)
+            BROADCAST_SEND_RATE.set(result.rate)
+
+            # Unsubscribe blocked chats and back off repeat failures, one transaction per batch
+            await db.record_delivery_results(result.delivered, result.blocked, result.failed)
+
+            # A broken digest is not the recipients' fault and would fail for everyone
+            if result.content_error is not None:
+                await self.outbox.abort_digest(digest_id, str(result.content_error))
+                return
+
+        await self.outbox.finish_digest(digest_id)
+
+        # Log results
+        end_time = datetime.now()
+        duration = (end_time - start_time).total_seconds()
+        rate = success_count / duration if duration > 0 else 0.0
+
+        logger.info(f"Digest {digest_id} completed in {duration:.1f}s - Success: {success_count}, "
+                    f"Errors: {error_count}, Rate: {rate:.1f} msg/s")
+
+        # Optional: Send admin notification if many errors
+        if error_count > success_count * 0.1:  # More than 10% errors
+            logger.warning(f"High error rate in digest {digest_id}: {error_count}/{success_count + error_count}")
+
+    async def resume_broadcasts(self):
+        """Resume digests interrupted by a restart"""
+        try:
+            for digest_id in await self.outbox.recover():
+                digest = await self.outbox.get_digest(digest_id)
+                if digest and digest['status'] == 'queuing':
+                    await self.queue_recipients(digest_id, digest['slot'])
+                await self.deliver_digest(digest_id)
 
         except Exception as e:
-            logger.error(f"Critical error in daily digest: {e}")
+            logger.error(f"Error resuming broadcasts: {e}")
 
     def start(self):
         """Start the scheduler"""
@@ -87,28 +171,85 @@ class DigestScheduler:
                 logger.warning("Scheduler already running")
                 return
 
-            # Schedule daily digest
+            # One job per delivery slot, so a late run still knows which slot it is for
+            for slot in range(0, 24 * 60, DELIVERY_SLOT_MINUTES):
+                self.scheduler.add_job(
+                    self.send_slot_digest,
+                    CronTrigger(
+                        hour=slot // 60,
+                        minute=slot % 60,
+                        timezone='UTC'  # Always use UTC
+                    ),
+                    args=[slot],
+                    id=f'daily_digest_{slot:04d}',
+                    max_instances=1,
+                    coalesce=True,    # Combine missed executions
+                    misfire_grace_time=DELIVERY_SLOT_MINUTES * 60
+                )
+
+            # Keep UTC slots in line with daylight saving changes, prune old broadcasts
+            self.scheduler.add_job(
+                self.run_daily_maintenance,
+                CronTrigger(hour=0, minute=1, timezone='UTC'),
+                id='daily_maintenance',
+                max_instances=1,
+                coalesce=True
+            )
+
+            # Finish broadcasts a restart interrupted
+            self.scheduler.add_job(
+                self.resume_broadcasts,
+                id='resume_broadcasts',
+                next_run_time=datetime.now()
+            )
+
+            # Keep the processed-article snapshot warm for /today and /hot
             self.scheduler.add_job(
-                self.send_daily_digest,
-                CronTrigger(
-                    hour=DIGEST_TIME_HOUR, 
-                    minute=DIGEST_TIME_MINUTE,
-                    timezone='UTC'  # Always use UTC
-                ),
-                id='daily_digest',
-                max_instances=1,  # Prevent overlapping executions
-                coalesce=True,    # Combine missed executions
-                misfire_grace_time=900  # Allow 15 minutes grace time
+                self.news_processor.refresh_snapshot,
+                IntervalTrigger(minutes=SNAPSHOT_REFRESH_MINUTES),
+                id='refresh_snapshot',
+                next_run_time=datetime.now(),  # Build the first snapshot right away
+                max_instances=1,
+                coalesce=True
+            )
+
+            # Write buffered last_active timestamps in one transaction
+            self.scheduler.add_job(
+                self.flush_activity,
+                IntervalTrigger(seconds=ACTIVITY_FLUSH_SECONDS),
+                id='flush_activity',
+                max_instances=1,
+                coalesce=True
             )
 
             self.scheduler.start()
             self.is_running = True
 
-            logger.info(f"📅 Scheduler started - Daily digest at {DIGEST_TIME_HOUR:02d}:{DIGEST_TIME_MINUTE:02d} UTC")
+            logger.info(f"📅 Scheduler started - Digest slots every {DELIVERY_SLOT_MINUTES} min UTC, "
+                        f"snapshot refresh every {SNAPSHOT_REFRESH_MINUTES} min")
 
         except Exception as e:
             logger.error(f"Failed to start scheduler: {e}")
 
+    async def flush_activity(self):
+        """Write buffered last_active timestamps on the database thread"""
+        try:
+            await AsyncDatabase(self.news_processor.activity).flush()
+
+        except Exception as e:
+            logger.error(f"Error flushing activity: {e}")
+
+    async def run_daily_maintenance(self):
+        """Recompute UTC delivery slots for today's offsets and prune old broadcasts and AI results"""
+        try:
+            await self.news_processor.adb.recompute_delivery_slots()
+            await self.outbox.prune(OUTBOX_RETENTION_DAYS)
+            await AsyncDatabase(self.news_processor.ai_processor.cache).prune(AI_CACHE_RETENTION_DAYS)
+            logger.info("Daily maintenance completed")
+
+        except Exception as e:
+            logger.error(f"Error in daily maintenance: {e}")
+
     def stop(self):
         """Stop the scheduler"""
         try:
@@ -123,10 +264,11 @@ class DigestScheduler:
     def get_next_run_time(self):
         """Get next scheduled run time"""
         try:
-            job = self.scheduler.get_job('daily_digest')
-            if job:
-                return job.next_run_time
-            return None
+            run_times = [
+                job.next_run_time for job in self.scheduler.get_jobs()
+                if job.id.startswith('daily_digest_') and job.next_run_time
+            ]
+            return min(run_times, default=None)
 
         except Exception as e:
             logger.error(f"Error getting next run time: {e}")
@@ -142,15 +284,16 @@ class DigestScheduler:
             logger.info(f"Testing digest generation for chat {chat_id}")
 
             # Generate test digest
-            digest_message = await self.news_processor.get_daily_digest()
+            pages = await self.news_processor.get_daily_digest()
 
-            if digest_message:
-                await self.bot.send_message(
-                    chat_id=chat_id,
-                    text="🧪 **TEST DIGEST**\n\n" + digest_message,
-                    parse_mode='Markdown',
-                    disable_web_page_preview=True
-                )
+            if pages:
+                for i, page in enumerate(pages):
+                    await self.bot.send_message(
+                        chat_id=chat_id,
+                        text=("🧪 **TEST DIGEST**\n\n" if i == 0 else "") + page,
+                        parse_mode='Markdown',
+                        disable_web_page_preview=True
+                    )
                 logger.info("Test digest sent successfully")
             else:
                 await self.bot.send_message(
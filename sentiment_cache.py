@@ -0,0 +1,121 @@
+import hashlib
+import json
+import logging
+import threading
+from collections import OrderedDict
+from db_connection import get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class ResultCache:
+    """Bounded LRU cache for AI results keyed by a content hash.
+
+    When `db_path` is set, entries are also written to an `ai_cache` table so
+    results survive restarts; memory misses fall back to that table.
+    """
+
+    def __init__(self, max_size=5000, db_path=None):
+        self.max_size = max_size
+        self.db_path = db_path
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+        self.connection = get_connection(db_path) if db_path else None
+
+        if self.db_path:
+            self.init_db()
+
+    def init_db(self):
+        """Initialize persistent cache table"""
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS ai_cache (
+                        key TEXT PRIMARY KEY,
+                        value TEXT NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+
+        except Exception as e:
+            logger.error(f"AI cache initialization error: {e}")
+            self.db_path = None
+
+    @staticmethod
+    def make_key(namespace, *parts):
+        """Hash content into a cache key"""
+        digest = hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+        return f"{namespace}:{digest}"
+
+    def get(self, key):
+        """Return a cached value or None"""
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+
+        value = self.load(key)
+
+        if value is not None:
+            with self.lock:
+                self.remember(key, value)
+
+        return value
+
+    def put(self, key, value):
+        """Cache a JSON-serializable value"""
+        with self.lock:
+            self.remember(key, value)
+
+        self.store(key, value)
+
+    def remember(self, key, value):
+        """Insert into the in-memory LRU, evicting the oldest entries (lock held)"""
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def load(self, key):
+        """Read a value from the persistent table"""
+        if not self.db_path:
+            return None
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('SELECT value FROM ai_cache WHERE key = ?', (key,))
+                row = cursor.fetchone()
+                return json.loads(row[0]) if row else None
+
+        except Exception as e:
+            logger.error(f"Error reading AI cache: {e}")
+            return None
+
+    def store(self, key, value):
+        """Write a value to the persistent table"""
+        if not self.db_path:
+            return
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    INSERT OR REPLACE INTO ai_cache (key, value) VALUES (?, ?)
+                ''', (key, json.dumps(value)))
+
+        except Exception as e:
+            logger.error(f"Error writing AI cache: {e}")
+
+    def prune(self, retention_days):
+        """Delete persisted results older than the retention window"""
+        if not self.db_path:
+            return
+
+        try:
+            with self.connection.transaction() as cursor:
+                cursor.execute('''
+                    DELETE FROM ai_cache WHERE created_at < datetime('now', ?)
+                ''', (f'-{int(retention_days)} days',))
+
+        except Exception as e:
+            logger.error(f"Error pruning AI cache: {e}")
@@ -0,0 +1,50 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key into one in-flight build.
+
+    Callers arriving while a build runs await that build instead of starting
+    their own. Successful results are kept for `ttl` seconds so callers that
+    arrive right after it finishes reuse it too; failures are not cached.
+    """
+
+    def __init__(self, ttl=0):
+        self.ttl = ttl
+        self.inflight = {}
+        self.results = {}  # key -> (expires_at, value)
+
+    async def do(self, key, func):
+        """Return func()'s result, sharing it with concurrent callers"""
+        cached = self.results.get(key)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+
+        task = self.inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func())
+            self.inflight[key] = task
+            task.add_done_callback(lambda finished: self.finish(key, finished))
+        else:
+            logger.debug(f"Joining in-flight build for {key}")
+
+        # One caller being cancelled must not cancel the shared build
+        return await asyncio.shield(task)
+
+    def finish(self, key, task):
+        """Drop the in-flight entry and cache a successful result"""
+        self.inflight.pop(key, None)
+
+        if self.ttl > 0 and not task.cancelled() and task.exception() is None:
+            self.results[key] = (time.monotonic() + self.ttl, task.result())
+
+    def invalidate(self, key=None):
+        """Forget cached results for a key, or all keys"""
+        if key is None:
+            self.results.clear()
+        else:
+            self.results.pop(key, None)
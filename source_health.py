@@ -0,0 +1,125 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from config import (
+    FETCH_TIMEOUT, SOURCE_TIMEOUT_MIN, SOURCE_TIMEOUT_FACTOR, SOURCE_LATENCY_WINDOW,
+    CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_COOLDOWN, CIRCUIT_MAX_COOLDOWN
+)
+
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+class SourceHealth:
+    """Per-source latency, error streaks and circuit breakers.
+
+    Every fetch reports its outcome here. Recent full-download latencies give
+    each source its own timeout (a multiple of its p95, between SOURCE_TIMEOUT_MIN and
+    FETCH_TIMEOUT). After CIRCUIT_FAILURE_THRESHOLD consecutive failures the
+    source's circuit opens and `allow` skips it for a cooldown; the first
+    fetch after the cooldown is a trial that either closes the circuit or
+    reopens it with the cooldown doubled, up to CIRCUIT_MAX_COOLDOWN.
+    """
+
+    def __init__(self):
+        self.sources = {}  # source_name -> health record
+        self.lock = threading.Lock()
+
+    def record(self, source_name):
+        """Health record for a source, created on first use (lock held)"""
+        return self.sources.setdefault(source_name, {
+            'latencies': deque(maxlen=SOURCE_LATENCY_WINDOW),
+            'last_success': None,
+            'last_error': None,
+            'error_streak': 0,
+            'cooldown': CIRCUIT_COOLDOWN,
+            'open_until': 0.0
+        })
+
+    def timeout_for(self, source_name):
+        """Read timeout for the next fetch of this source, in seconds"""
+        with self.lock:
+            latencies = sorted(self.record(source_name)['latencies'])
+
+        # Too few samples to judge the source, use the global timeout
+        if len(latencies) < 5:
+            return FETCH_TIMEOUT
+
+        return min(FETCH_TIMEOUT, max(SOURCE_TIMEOUT_MIN, percentile(latencies, 0.95) * SOURCE_TIMEOUT_FACTOR))
+
+    def allow(self, source_name):
+        """Whether the source may be fetched now (its circuit is not open)"""
+        with self.lock:
+            return time.monotonic() >= self.record(source_name)['open_until']
+
+    def record_success(self, source_name, seconds=None):
+        """Close the circuit; `seconds` is a full download's latency, None for a 304"""
+        with self.lock:
+            health = self.record(source_name)
+            if health['error_streak'] >= CIRCUIT_FAILURE_THRESHOLD:
+                logger.info(f"Circuit for {source_name} closed after {health['error_streak']} failures")
+
+            # A 304 has no body, its latency would shrink the body deadline
+            if seconds is not None:
+                health['latencies'].append(seconds)
+            health['last_success'] = datetime.now(timezone.utc)
+            health['error_streak'] = 0
+            health['cooldown'] = CIRCUIT_COOLDOWN
+            health['open_until'] = 0.0
+
+    def record_failure(self, source_name, error):
+        with self.lock:
+            health = self.record(source_name)
+            health['last_error'] = str(error)
+            health['error_streak'] += 1
+
+            if health['error_streak'] < CIRCUIT_FAILURE_THRESHOLD:
+                return
+
+            # A failed trial after a cooldown backs off further
+            if health['error_streak'] > CIRCUIT_FAILURE_THRESHOLD:
+                health['cooldown'] = min(health['cooldown'] * 2, CIRCUIT_MAX_COOLDOWN)
+
+            health['open_until'] = time.monotonic() + health['cooldown']
+            logger.warning(
+                f"Circuit for {source_name} open for {health['cooldown']}s "
+                f"after {health['error_streak']} failures: {error}"
+            )
+
+    def state(self, health, now):
+        """'open' while skipped, 'half_open' until a trial succeeds, else 'closed'"""
+        if now < health['open_until']:
+            return 'open'
+        if health['error_streak'] >= CIRCUIT_FAILURE_THRESHOLD:
+            return 'half_open'
+        return 'closed'
+
+    def snapshot(self):
+        """Health of every known source, for /stats"""
+        now = time.monotonic()
+        sources = []
+
+        with self.lock:
+            for source_name, health in sorted(self.sources.items()):
+                latencies = sorted(health['latencies'])
+                sources.append({
+                    'source': source_name,
+                    'state': self.state(health, now),
+                    'reopens_in': max(0, round(health['open_until'] - now)),
+                    'p50': percentile(latencies, 0.5),
+                    'p95': percentile(latencies, 0.95),
+                    'last_success': health['last_success'],
+                    'last_error': health['last_error'],
+                    'error_streak': health['error_streak']
+                })
+
+        return sources
@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from dedup import TitleDeduplicator
+from config import DEDUP_SIMILARITY_THRESHOLD
+
+WORDS = ['bitcoin', 'ethereum', 'etf', 'price', 'surges', 'drops', 'sec', 'approval', 'market',
+         'whales', 'record', 'high', 'low', 'rally', 'crash', 'fund', 'inflows', 'traders', 'new', 'week']
+
+
+def pairwise_filter(articles, threshold=DEDUP_SIMILARITY_THRESHOLD):
+    """The pairwise comparison TitleDeduplicator replaced"""
+    unique_articles = []
+    seen_titles = []
+
+    for article in articles:
+        title_words = set(article['title'].lower().strip().split())
+
+        is_duplicate = False
+        for seen_words in seen_titles:
+            if title_words and seen_words:
+                common_words = title_words.intersection(seen_words)
+                if len(common_words) / max(len(title_words), len(seen_words)) > threshold:
+                    is_duplicate = True
+                    break
+
+        if not is_duplicate:
+            seen_titles.append(title_words)
+            unique_articles.append(article)
+
+    return unique_articles
+
+
+def random_articles(seed, count=400):
+    rng = random.Random(seed)
+    articles = []
+    for i in range(count):
+        if articles and rng.random() < 0.3:
+            # Variation of an earlier title: drop, swap or add a word
+            words = articles[rng.randrange(len(articles))]['title'].split()
+            edit = rng.choice(('drop', 'swap', 'add'))
+            if edit == 'drop' and len(words) > 1:
+                words.pop(rng.randrange(len(words)))
+            elif edit == 'swap':
+                words[rng.randrange(len(words))] = rng.choice(WORDS)
+            else:
+                words.append(rng.choice(WORDS))
+            title = ' '.join(words)
+        else:
+            title = ' '.join(rng.sample(WORDS, rng.randint(1, 9)))
+
+        articles.append({'title': title.upper() if rng.random() < 0.1 else title, 'id': i})
+    return articles
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_matches_pairwise_dedup(seed):
+    articles = random_articles(seed)
+
+    assert TitleDeduplicator().filter(articles) == pairwise_filter(articles)
+
+
+@pytest.mark.parametrize('threshold', [0.5, 0.7, 0.9])
+def test_matches_pairwise_dedup_at_other_thresholds(threshold):
+    articles = random_articles(42)
+
+    assert TitleDeduplicator(threshold).filter(articles) == pairwise_filter(articles, threshold)
+
+
+def test_similarity_must_exceed_threshold():
+    # 7 of 10 words shared is exactly 0.7, which is not a duplicate
+    first = 'a b c d e f g h i j'
+    exactly = 'a b c d e f g x y z'
+    above = 'a b c d e f g h y z'
+    deduplicator = TitleDeduplicator(0.7)
+
+    assert not deduplicator.is_duplicate(first)
+    assert not deduplicator.is_duplicate(exactly)
+    assert deduplicator.is_duplicate(above)
+
+
+def test_empty_titles_are_kept():
+    articles = [{'title': ''}, {'title': '   '}, {'title': 'Bitcoin rallies'}]
+
+    assert TitleDeduplicator().filter(articles) == articles
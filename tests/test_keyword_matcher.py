@@ -0,0 +1,51 @@
+import pytest
+
+from keyword_matcher import KeywordMatcher
+from config import RANKING_KEYWORDS, INSIGHT_KEYWORDS
+
+
+@pytest.mark.parametrize('text, keyword', [
+    ('Spot ETFs see record inflows', 'etf'),
+    ('Token prices slide', 'price'),
+    ('ETH staking opens', 'eth'),
+    ('SEC delays decision', 'sec'),
+])
+def test_matches_keywords_and_plurals(text, keyword):
+    assert keyword in KeywordMatcher(RANKING_KEYWORDS).find_all(text)
+
+
+@pytest.mark.parametrize('text, keyword', [
+    ('Ethereum upgrade ships', 'eth'),
+    ('Getting together for the second time', 'eth'),
+    ('A second look at stablecoins', 'sec'),
+    ('Security firm warns of exploit', 'sec'),
+])
+def test_keywords_do_not_match_inside_words(text, keyword):
+    assert keyword not in KeywordMatcher(RANKING_KEYWORDS).find_all(text)
+
+
+def test_matches_are_reported_as_lowercase_keywords():
+    matcher = KeywordMatcher(RANKING_KEYWORDS)
+
+    assert matcher.find_all('BITCOIN and Ethereum ETFs') == {'bitcoin', 'ethereum', 'etf'}
+
+
+def test_first_match_follows_priority_order():
+    matcher = KeywordMatcher(list(INSIGHT_KEYWORDS))
+
+    # 'etf' appears first in the text, but 'bitcoin' comes first in the table
+    assert matcher.first_match('ETF filings lift Bitcoin') == 'bitcoin'
+    assert matcher.first_match('SEC reviews new ETFs') == 'sec'
+    assert matcher.first_match('Market prices cool') == 'price'
+
+
+def test_first_match_limited_to_candidates():
+    matcher = KeywordMatcher(list(INSIGHT_KEYWORDS))
+
+    assert matcher.first_match('ETF filings lift Bitcoin', candidates={'etf'}) == 'etf'
+    assert matcher.first_match('ETF filings lift Bitcoin', candidates={'defi'}) is None
+
+
+def test_no_keywords_match_nothing():
+    assert KeywordMatcher([]).find_all('bitcoin') == set()
+    assert KeywordMatcher(RANKING_KEYWORDS).first_match('') is None
@@ -0,0 +1,129 @@
+import asyncio
+from collections import Counter
+
+from outbox import BroadcastOutbox
+from broadcast import Broadcaster
+from scheduler import DigestScheduler
+
+USERS = list(range(1, 251))
+
+
+def queue_digest(outbox, digest_id='2026-01-01-all', users=USERS):
+    outbox.create_digest(digest_id, None, ['page 1', 'page 2'])
+    outbox.enqueue(digest_id, users)
+    outbox.mark_queued(digest_id, len(users))
+    return digest_id
+
+
+def drain(outbox, digest_id, sent, batch_size=100):
+    """Send every pending row like deliver_digest does, recording sends"""
+    while True:
+        batch = outbox.claim_batch(digest_id, batch_size)
+        if not batch:
+            break
+        sent.update(batch)
+        outbox.mark_sent(digest_id, batch)
+    return outbox.finish_digest(digest_id)
+
+
+def test_enqueue_is_idempotent(tmp_path):
+    outbox = BroadcastOutbox(str(tmp_path / 'outbox.db'))
+    digest_id = queue_digest(outbox)
+
+    outbox.enqueue(digest_id, USERS[:100])
+
+    assert outbox.get_history()[0]['recipients'] == len(USERS)
+    assert outbox.last_enqueued(digest_id) == USERS[-1]
+
+
+def test_crash_mid_batch_resends_at_most_that_batch(tmp_path):
+    db_path = str(tmp_path / 'outbox.db')
+    outbox = BroadcastOutbox(db_path)
+    digest_id = queue_digest(outbox)
+    sent = Counter()
+
+    # First batch completes, the second is claimed and the process dies
+    first = outbox.claim_batch(digest_id, 100)
+    sent.update(first)
+    outbox.mark_sent(digest_id, first)
+    in_flight = outbox.claim_batch(digest_id, 100)
+    sent.update(in_flight)
+
+    # Restart
+    restarted = BroadcastOutbox(db_path)
+    assert restarted.recover() == [digest_id]
+    assert drain(restarted, digest_id, sent)
+
+    assert set(sent) == set(USERS)
+    assert {user_id for user_id, count in sent.items() if count > 1} <= set(in_flight)
+    assert max(sent.values()) == 2
+
+    history = restarted.get_history()[0]
+    assert (history['status'], history['sent'], history['failed']) == ('done', len(USERS), 0)
+    assert restarted.recover() == []
+
+
+def test_finished_digest_is_not_sent_again(tmp_path):
+    outbox = BroadcastOutbox(str(tmp_path / 'outbox.db'))
+    digest_id = queue_digest(outbox)
+    sent = Counter()
+
+    assert drain(outbox, digest_id, sent)
+    assert drain(outbox, digest_id, sent) is False
+    assert max(sent.values()) == 1
+
+
+def test_aborted_digest_is_not_recovered(tmp_path):
+    outbox = BroadcastOutbox(str(tmp_path / 'outbox.db'))
+    digest_id = queue_digest(outbox)
+    outbox.claim_batch(digest_id, 100)
+
+    outbox.abort_digest(digest_id, "Can't parse entities")
+
+    assert outbox.recover() == []
+    assert outbox.get_digest(digest_id)['status'] == 'aborted'
+    assert outbox.get_history()[0]['failed'] == len(USERS)
+
+
+class FakeBot:
+    def __init__(self):
+        self.sent = Counter()
+
+    async def send_message(self, chat_id, text, **kwargs):
+        self.sent[chat_id, text] += 1
+
+
+class FakeUserStore:
+    async def get_subscriber_page(self, after_user_id=0, limit=1000, slot=None):
+        return [user_id for user_id in USERS if user_id > after_user_id][:limit]
+
+    async def record_delivery_results(self, delivered, blocked, failed):
+        pass
+
+
+class FakeNewsProcessor:
+    adb = FakeUserStore()
+
+
+def test_resume_broadcasts_finishes_a_crashed_digest(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'outbox.db')
+    outbox = BroadcastOutbox(db_path)
+    digest_id = queue_digest(outbox)
+
+    # Crash with one batch delivered and one in flight
+    first = outbox.claim_batch(digest_id, 100)
+    outbox.mark_sent(digest_id, first)
+    in_flight = outbox.claim_batch(digest_id, 100)
+
+    monkeypatch.setattr('scheduler.DATABASE_PATH', db_path)
+    bot = FakeBot()
+    scheduler = DigestScheduler(bot, FakeNewsProcessor())
+    scheduler.broadcaster = Broadcaster(bot, rate=100000, per_chat_interval=0)
+
+    asyncio.run(scheduler.resume_broadcasts())
+
+    resent = {chat_id for chat_id, _ in bot.sent}
+    assert resent == set(USERS) - set(first)
+    assert resent >= set(in_flight)
+    assert max(bot.sent.values()) == 1
+    assert outbox.get_digest(digest_id)['status'] == 'done'
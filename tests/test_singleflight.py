@@ -0,0 +1,134 @@
+import asyncio
+
+import pytest
+
+from singleflight import SingleFlight
+
+
+class Build:
+    """Counts calls; each call waits until released"""
+
+    def __init__(self, result='digest', error=None):
+        self.calls = 0
+        self.result = result
+        self.error = error
+        self.release = None
+
+    async def __call__(self):
+        self.calls += 1
+        await self.release.wait()
+        if self.error:
+            raise self.error
+        return self.result
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_concurrent_callers_share_one_build():
+    async def scenario():
+        flight = SingleFlight()
+        build = Build()
+        build.release = asyncio.Event()
+
+        callers = [asyncio.create_task(flight.do('digest', build)) for _ in range(10)]
+        await asyncio.sleep(0)
+        build.release.set()
+
+        results = await asyncio.gather(*callers)
+        return build.calls, results, flight.inflight
+
+    calls, results, inflight = run(scenario())
+
+    assert calls == 1
+    assert results == ['digest'] * 10
+    assert inflight == {}
+
+
+def test_different_keys_build_separately():
+    async def scenario():
+        flight = SingleFlight()
+        build = Build()
+        build.release = asyncio.Event()
+        build.release.set()
+
+        await asyncio.gather(flight.do('a', build), flight.do('b', build))
+        return build.calls
+
+    assert run(scenario()) == 2
+
+
+def test_results_are_reused_within_ttl_only():
+    async def scenario():
+        flight = SingleFlight(ttl=60)
+        build = Build()
+        build.release = asyncio.Event()
+        build.release.set()
+
+        await flight.do('digest', build)
+        await flight.do('digest', build)
+        cached_calls = build.calls
+
+        flight.invalidate('digest')
+        await flight.do('digest', build)
+        return cached_calls, build.calls
+
+    assert run(scenario()) == (1, 2)
+
+
+def test_without_ttl_every_sequential_call_builds():
+    async def scenario():
+        flight = SingleFlight()
+        build = Build()
+        build.release = asyncio.Event()
+        build.release.set()
+
+        await flight.do('digest', build)
+        await flight.do('digest', build)
+        return build.calls
+
+    assert run(scenario()) == 2
+
+
+def test_failures_reach_every_caller_and_are_not_cached():
+    async def scenario():
+        flight = SingleFlight(ttl=60)
+        build = Build(error=RuntimeError('feeds down'))
+        build.release = asyncio.Event()
+
+        callers = [asyncio.create_task(flight.do('digest', build)) for _ in range(3)]
+        await asyncio.sleep(0)
+        build.release.set()
+        results = await asyncio.gather(*callers, return_exceptions=True)
+
+        build.error = None
+        retried = await flight.do('digest', build)
+        return build.calls, results, retried
+
+    calls, results, retried = run(scenario())
+
+    assert calls == 2
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == 'digest'
+
+
+def test_cancelled_caller_does_not_cancel_shared_build():
+    async def scenario():
+        flight = SingleFlight()
+        build = Build()
+        build.release = asyncio.Event()
+
+        impatient = asyncio.create_task(flight.do('digest', build))
+        patient = asyncio.create_task(flight.do('digest', build))
+        await asyncio.sleep(0)
+
+        impatient.cancel()
+        await asyncio.sleep(0)
+        build.release.set()
+
+        with pytest.raises(asyncio.CancelledError):
+            await impatient
+        return build.calls, await patient
+
+    assert run(scenario()) == (1, 'digest')
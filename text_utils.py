@@ -0,0 +1,48 @@
+"""Shared text normalization for feed content.
+
+Most titles are plain text and most summaries only carry a few simple
+tags, so tags are stripped with a regex and entities decoded with
+html.unescape. The full BeautifulSoup parser is only used for markup the
+regex cannot handle safely (scripts, styles, comments, CDATA or stray
+angle brackets).
+"""
+import html
+import re
+from bs4 import BeautifulSoup
+
+TAG_RE = re.compile(r'<[^<>]*>')
+COMPLEX_MARKUP_RE = re.compile(r'<(?:script|style)\b|<!--|<!\[CDATA\[', re.IGNORECASE)
+
+
+def strip_html(text):
+    """Remove HTML tags and decode entities"""
+    if not text:
+        return ""
+
+    # Plain text: nothing to parse
+    if '<' not in text:
+        return html.unescape(text) if '&' in text else text
+
+    # Simply tagged text: regex strip is enough
+    if not COMPLEX_MARKUP_RE.search(text):
+        stripped = TAG_RE.sub('', text)
+        if '<' not in stripped and '>' not in stripped:
+            return html.unescape(stripped)
+
+    # Anything else goes through the full parser
+    return BeautifulSoup(text, 'html.parser').get_text()
+
+
+def normalize_whitespace(text):
+    """Collapse runs of whitespace into single spaces"""
+    return ' '.join(text.split())
+
+
+def clean_html_text(text, max_length=None):
+    """Strip HTML, collapse whitespace and optionally limit length"""
+    clean_text = normalize_whitespace(strip_html(text))
+
+    if max_length and len(clean_text) > max_length:
+        clean_text = clean_text[:max_length] + "..."
+
+    return clean_text
@@ -0,0 +1,83 @@
+"""Webhook listener that also serves Prometheus metrics.
+
+Application.run_webhook owns its HTTP server, so there is no way to add
+routes to it. This runs an equivalent tornado server on the same port with
+two routes: the webhook path, which feeds updates into the application's
+update queue, and /metrics.
+"""
+import asyncio
+import json
+import logging
+import signal
+from urllib.parse import urlparse
+
+import tornado.httpserver
+import tornado.web
+from telegram import Update
+
+from metrics import render, CONTENT_TYPE
+
+logger = logging.getLogger(__name__)
+
+
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_application):
+        self.bot_application = bot_application
+
+    async def post(self):
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.bot_application.bot)
+        except Exception as e:
+            logger.error(f"Invalid webhook payload: {e}")
+            raise tornado.web.HTTPError(400)
+
+        await self.bot_application.update_queue.put(update)
+        self.set_status(200)
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def get(self):
+        self.set_header('Content-Type', CONTENT_TYPE)
+        self.write(render())
+
+
+async def serve_webhook(application, listen, port, webhook_url, allowed_updates=None):
+    """Serve the webhook and /metrics until SIGINT/SIGTERM"""
+    url_path = urlparse(webhook_url).path or '/'
+    server = tornado.httpserver.HTTPServer(tornado.web.Application([
+        (r'/metrics', MetricsHandler),
+        (url_path, TelegramWebhookHandler, {'bot_application': application}),
+    ]))
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    try:
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+
+        server.listen(port, address=listen)
+        await application.bot.set_webhook(url=webhook_url, allowed_updates=allowed_updates)
+        await application.start()
+        logger.info(f"Webhook listening on {listen}:{port}{url_path}, metrics on /metrics")
+
+        await stop.wait()
+
+    finally:
+        server.stop()
+        if application.running:
+            await application.stop()
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+
+
+def run_webhook(application, listen, port, webhook_url, allowed_updates=None):
+    """Blocking entry point, like Application.run_webhook"""
+    # Same loop the scheduler was started on
+    asyncio.get_event_loop().run_until_complete(
+        serve_webhook(application, listen, port, webhook_url, allowed_updates)
+    )